@@ -65,7 +65,9 @@ def create_app(config_class=Config):
     with app.app_context():
         from app import models
         from app.routes.main_flow_bp import main_flow_bp
+        from app.routes.admin_bp import admin_bp
         app.register_blueprint(main_flow_bp)
+        app.register_blueprint(admin_bp)
 
     app.logger.info("Flask application initialized")
     return app
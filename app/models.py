@@ -1,4 +1,7 @@
 from flask_sqlalchemy import model
+from sqlalchemy import tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
 from . import db
 
 BaseModel: model = db.Model
@@ -6,7 +9,7 @@ BaseModel: model = db.Model
 class UserData(db.Model):
     __tablename__ = 'user_data'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.String(255), nullable=False)
+    user_id = db.Column(db.String(255), nullable=False, unique=True, index=True)
     display_name = db.Column(db.String(255))
     followers = db.Column(db.Integer)
     image_url = db.Column(db.Text)
@@ -18,10 +21,145 @@ class UserData(db.Model):
     top_tracks_medium_term = db.Column(db.JSON)
     top_tracks_short_term = db.Column(db.JSON)
     playlists = db.Column(db.JSON)
-    created_at = db.Column(db.DateTime, default=db.func.now())
+    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now(), server_default=db.func.now())
     access_token = db.Column(db.Text, nullable=False)
     refresh_token = db.Column(db.Text, nullable=False)
     mailing_list = db.Column(db.Boolean, default=False)
     spotify_subscribe = db.Column(db.Boolean, default=False)
     email = db.Column(db.String(255), nullable=True)
     processed = db.Column(db.Boolean, default=False)
+    section_hashes = db.Column(db.JSON)  # snapshot section -> content hash of its last stored value
+    refreshed_at = db.Column(db.DateTime)
+
+
+# UserData JSON column -> (item type, time range) of its normalized rows
+TOP_ITEM_COLUMNS = {
+    "top_artists_long_term": ("artist", "long_term"),
+    "top_artists_medium_term": ("artist", "medium_term"),
+    "top_artists_short_term": ("artist", "short_term"),
+    "top_tracks_long_term": ("track", "long_term"),
+    "top_tracks_medium_term": ("track", "medium_term"),
+    "top_tracks_short_term": ("track", "short_term"),
+}
+
+
+class Artist(db.Model):
+    __tablename__ = 'artists'
+    id = db.Column(db.String(64), primary_key=True)  # Spotify artist ID
+    name = db.Column(db.String(255))
+
+
+class Track(db.Model):
+    __tablename__ = 'tracks'
+    id = db.Column(db.String(64), primary_key=True)  # Spotify track ID
+    name = db.Column(db.String(255))
+    artist_name = db.Column(db.String(255))
+
+
+class UserTopItem(db.Model):
+    """One entry of a user's top artists or tracks for a time range.
+
+    ``item_id`` is an ``artists.id`` or a ``tracks.id`` depending on
+    ``item_type``. The primary key serves per-user reads; the item index
+    serves "which users have X in their top" queries.
+    """
+    __tablename__ = 'user_top_items'
+    user_id = db.Column(
+        db.String(255), db.ForeignKey('user_data.user_id', ondelete='CASCADE'), primary_key=True
+    )
+    item_type = db.Column(db.String(16), primary_key=True)
+    time_range = db.Column(db.String(16), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)
+    item_id = db.Column(db.String(64), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_user_top_items_item', 'item_type', 'item_id', 'time_range'),
+    )
+
+    @classmethod
+    def users_with(cls, session, item_type, item_id, time_range=None):
+        """User IDs with the item in their top list, optionally for one time range only.
+
+        A reporting query: pass an ``analytics_session()`` rather than ``db.session``.
+        """
+        query = session.query(cls.user_id).filter_by(item_type=item_type, item_id=item_id)
+        if time_range:
+            query = query.filter_by(time_range=time_range)
+        return [user_id for (user_id,) in query.distinct()]
+
+
+def spotify_id(url):
+    """The ID at the end of an open.spotify.com URL, ignoring any query string."""
+    if not url:
+        return None
+    return url.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1] or None
+
+
+def store_top_items(user_id, values):
+    """Replace the user's normalized top items with the lists in ``values``.
+
+    ``values`` maps UserData top item columns to their lists, as stored in
+    the JSON columns; only the time ranges present are replaced. Artists and
+    tracks are upserted along the way. The caller commits.
+    """
+    ranges = [TOP_ITEM_COLUMNS[column] for column in TOP_ITEM_COLUMNS if column in values]
+    if not ranges:
+        return
+
+    artists, tracks, items = {}, {}, []
+    for column, (item_type, time_range) in TOP_ITEM_COLUMNS.items():
+        for rank, item in enumerate(values.get(column) or [], start=1):
+            item_id = spotify_id(item.get("spotify_url"))
+            if not item_id:
+                continue
+            if item_type == "artist":
+                artists[item_id] = {"id": item_id, "name": item.get("name")}
+            else:
+                tracks[item_id] = {
+                    "id": item_id, "name": item.get("track_name"), "artist_name": item.get("artist_name")
+                }
+            items.append(
+                {"user_id": user_id, "item_type": item_type, "time_range": time_range,
+                 "rank": rank, "item_id": item_id}
+            )
+
+    # Sorted so concurrent writers lock shared rows in the same order
+    for table_model, rows in ((Artist, artists), (Track, tracks)):
+        if rows:
+            statement = insert(table_model).values([rows[item_id] for item_id in sorted(rows)])
+            statement = statement.on_conflict_do_update(
+                index_elements=[table_model.id],
+                set_={column: statement.excluded[column] for column in next(iter(rows.values())) if column != "id"},
+            )
+            db.session.execute(statement)
+
+    UserTopItem.query.filter(
+        UserTopItem.user_id == user_id,
+        tuple_(UserTopItem.item_type, UserTopItem.time_range).in_(ranges),
+    ).delete(synchronize_session=False)
+    if items:
+        db.session.execute(UserTopItem.__table__.insert(), items)
+
+
+def upsert_user_data(user_id, **values):
+    """Create or update the user's row in one ``INSERT ... ON CONFLICT`` statement.
+
+    Only the columns passed with a value are written; ``None`` never
+    overwrites what is stored. ``refresh_token`` is NOT NULL, so without one
+    no row is created and only an existing row is updated. Returns whether a
+    row was written. The caller commits.
+    """
+    values = {column: value for column, value in values.items() if value is not None}
+    if "refresh_token" not in values:
+        if not values:
+            return False
+        result = db.session.execute(update(UserData).where(UserData.user_id == user_id).values(**values))
+        return result.rowcount > 0
+
+    statement = insert(UserData).values(user_id=user_id, **values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserData.user_id],
+        set_={column: statement.excluded[column] for column in values},
+    )
+    db.session.execute(statement)
+    return True
@@ -0,0 +1,91 @@
+import hmac
+from functools import wraps
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from app.services.db_routing import analytics_session, pool_metrics
+from app.services.genre_cache import ArtistGenreCache
+from app.services.playlist_build_service import get_playlist_build_queue
+from app.services.redis_client import get_redis_client
+from app.services.spotify_client import get_spotify_client
+from app.services.user_export import (
+    EXPORT_AUDIENCES, EXPORT_FORMATS, EXPORT_MIMETYPES, UserExport, format_watermark, parse_watermark,
+)
+
+admin_bp = Blueprint('admin_bp', __name__, url_prefix='/admin')
+
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = current_app.config.get("ADMIN_TOKEN")
+        provided = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not expected or not hmac.compare_digest(provided, expected):
+            current_app.logger.warning(f"Rejected admin request to {request.path}")
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route("/playlist_statuses")
+@admin_required
+def playlist_statuses():
+    playlist_ids = [playlist_id for playlist_id in request.args.get("ids", "").split(",") if playlist_id]
+    if not playlist_ids or len(playlist_ids) > 1000:
+        return jsonify({"error": "Pass between 1 and 1000 comma-separated playlist ids"}), 400
+    statuses = get_playlist_build_queue().statuses.get_many(playlist_ids)
+    return jsonify({"statuses": statuses})
+
+
+@admin_bp.route("/db_pools")
+@admin_required
+def db_pools():
+    return jsonify({"pools": pool_metrics()})
+
+
+@admin_bp.route("/rate_limits")
+@admin_required
+def rate_limits():
+    rate_limiter = get_spotify_client().rate_limiter
+    if rate_limiter is None:
+        return jsonify({"enabled": False, "endpoints": {}})
+    return jsonify({"enabled": True, "endpoints": rate_limiter.get_metrics()})
+
+
+@admin_bp.route("/artist_genre_cache")
+@admin_required
+def artist_genre_cache():
+    cache = ArtistGenreCache(get_redis_client(), current_app.config["ARTIST_GENRE_CACHE_TTL"])
+    return jsonify({"metrics": cache.get_metrics()})
+
+
+@admin_bp.route("/export_users")
+@admin_required
+def export_users():
+    """Stream opted-in users; pass the ``X-Export-Watermark`` response header as ``since`` to export only newer ones."""
+    export_format = request.args.get("format", "csv")
+    audience = request.args.get("audience", "any")
+    if export_format not in EXPORT_FORMATS or audience not in EXPORT_AUDIENCES:
+        return jsonify({"error": f"format must be one of {list(EXPORT_FORMATS)}, audience one of {sorted(EXPORT_AUDIENCES)}"}), 400
+    try:
+        since = parse_watermark(request.args["since"]) if request.args.get("since") else None
+    except ValueError:
+        return jsonify({"error": "since must be a watermark: an ISO timestamp, optionally followed by ,<id>"}), 400
+
+    # Fix the upper bound before streaming so the next watermark can go out as a header
+    with analytics_session() as session:
+        until = UserExport(session, audience=audience).latest_watermark() or since
+
+    def generate():
+        # The session (and its server-side cursor) lives exactly as long as the response stream
+        with analytics_session() as session:
+            yield from UserExport(session, audience=audience, since=since, until=until).lines(export_format)
+
+    headers = {"Content-Disposition": f"attachment; filename=users.{export_format}"}
+    if until is not None:
+        headers["X-Export-Watermark"] = format_watermark(until)
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers=headers,
+    )
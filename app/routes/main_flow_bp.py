@@ -5,19 +5,22 @@ import uuid
 import subprocess
 import threading
 import json
-import redis
 from concurrent.futures import ThreadPoolExecutor
 from flask import (
-    Blueprint, current_app, jsonify, redirect, render_template,
-    request, send_file, send_from_directory, session, url_for, after_this_request, g
+    Blueprint, Response, current_app, jsonify, redirect, render_template,
+    request, send_file, send_from_directory, session, stream_with_context, url_for, after_this_request, g
 )
 from flask_wtf.csrf import generate_csrf
 from flask_session import Session
 from app import db
 from app.forms import CreatePlaylistForm
-from app.models import UserData
+from app.models import UserData, upsert_user_data
+from app.services.batching import with_app_context
+from app.services.build_progress import BuildProgress
 from app.services.image_service import ImageService
+from app.services.playlist_build_service import get_playlist_build_queue
 from app.services.playlist_service import PlaylistService
+from app.services.redis_client import get_redis_client
 from app.services.spotify_service import SpotifyService
 from app.services.user_service import UserService
 
@@ -31,15 +34,14 @@ def generate_state_string(length=16):
     letters_and_digits = string.ascii_letters + string.digits
     return ''.join(random.choice(letters_and_digits) for i in range(length))
 
-redis_url = os.getenv("REDIS_TLS_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379"
-current_app.redis_client = redis.Redis.from_url(redis_url, ssl_cert_reqs=None 
-                                    if redis_url.startswith("rediss://") else "required")
-playlist_statuses = {}
+current_app.redis_client = get_redis_client()
+# Build job state -> status reported to the loading page
+BUILD_STATUSES = {"queued": "in_progress", "running": "in_progress", "done": "ready", "failed": "error"}
 
 def get_image_service():
     global image_service
     if image_service is None:
-        image_service = ImageService(current_app.static_folder)
+        image_service = ImageService(current_app.static_folder, current_app.redis_client)
     return image_service
 
 # Initialize services in a factory function
@@ -55,6 +57,12 @@ def init_services(redis_client):
 def before_request():
     g.services = init_services(current_app.redis_client)
 
+def get_session_access_token():
+    return g.services['spotify_service'].get_access_token(session.get("user_id"))
+
+def get_session_refresh_token():
+    return g.services['spotify_service'].token_manager.get_refresh_token(session.get("user_id"))
+
 @main_flow_bp.before_request
 def before_request():
     if 'session_id' not in session:
@@ -124,27 +132,29 @@ def callback():
         current_app.logger.error("Invalid state")
         return redirect(url_for('main_flow_bp.index'))
 
-    user_id = state.split(':')[1]
-
     try:
-        token_data = g.services['spotify_service'].get_or_refresh_access_token(code=code, user_id=user_id)
+        token_data = g.services['spotify_service'].get_or_refresh_access_token(code=code)
         access_token = token_data['access_token']
         refresh_token = token_data['refresh_token']
 
         user_profile = g.services['spotify_service'].get_user_profile_data(access_token)
-        
-        current_app.redis_client.hmset(f"user_data:{user_id}", {
-            "access_token": access_token,
-            "refresh_token": refresh_token,
+
+        if not isinstance(user_profile, dict) or not user_profile.get('id'):
+            raise ValueError(f"Expected a Spotify profile with an id, got {user_profile!r}")
+
+        spotify_user_id = user_profile['id']
+
+        # Tokens are keyed by the Spotify account: the name typed on the form isn't unique
+        g.services['spotify_service'].token_manager.store(spotify_user_id, token_data)
+
+        # Start on the build's inputs now so they're ready by the time the loading page polls
+        executor.submit(with_app_context(g.services['spotify_service'].prefetch_candidate_pool), spotify_user_id)
+
+        current_app.redis_client.hmset(f"user_data:{spotify_user_id}", {
             "user_profile": json.dumps(user_profile)
         })
 
-        if not isinstance(user_profile, dict):
-            raise ValueError(f"Expected dictionary for user_profile, got {type(user_profile)}")
-
-        spotify_user_id = user_profile.get('id')
-        
-        session['user_id'] = user_id
+        session['user_id'] = spotify_user_id
         session['spotify_user_id'] = spotify_user_id
 
         user_name = state.split(':')[1] if ':' in state else 'User'
@@ -154,36 +164,20 @@ def callback():
         current_app.logger.debug(f"Set playlist_name in session: {playlist_name}")
 
         # Store user data
-        user_data = g.services['user_service'].get_user_data(spotify_user_id)
-        if user_data:
-            # Update existing user data
-            user_data.access_token = access_token
-            user_data.refresh_token = refresh_token
-            user_data.spotify_subscribe = session.get('spotify_subscribe', False)
-            user_data.display_name = user_profile.get('display_name')
-            user_data.followers = user_profile.get('followers')
-            user_data.image_url = user_profile.get('images', [{}])[0].get('url')
-            user_data.email = user_profile.get('email')
-            user_data.mailing_list = session.get('mailing_list', False)
-            user_data.processed = True
-        else:
-            # Create new user data
-            user_data = UserData(
-                user_id=spotify_user_id,
-                access_token=access_token,
-                refresh_token=refresh_token,
-                spotify_subscribe=session.get('spotify_subscribe', False),
-                display_name=user_profile.get('display_name'),
-                followers=user_profile.get('followers'),
-                image_url=user_profile.get('images', [{}])[0].get('url'),
-                email=user_profile.get('email'),
-                mailing_list=session.get('mailing_list', False),
-                processed=True
-            )
-            db.session.add(user_data)
-
+        upsert_user_data(
+            spotify_user_id,
+            access_token=access_token,
+            refresh_token=refresh_token,
+            spotify_subscribe=session.get('spotify_subscribe', False),
+            display_name=user_profile.get('display_name'),
+            followers=user_profile.get('followers'),
+            image_url=user_profile.get('images', [{}])[0].get('url'),
+            email=user_profile.get('email'),
+            mailing_list=session.get('mailing_list', False),
+            processed=True
+        )
         db.session.commit()
-        current_app.logger.debug(f"User data stored in database for user_id: {user_id}")
+        current_app.logger.debug(f"User data stored in database for user_id: {spotify_user_id}")
 
         # Initiate playlist creation process
         return create_playlist(user_name)
@@ -214,8 +208,8 @@ def loading():
     print("Loading page accessed")
     print(f"Session data: {session.items()}")
     playlist_id = session.get("playlist_id")
-    user_id = session.get("user_profile", {}).get("id")  # Change this line
-    access_token = session.get("access_token")
+    user_id = session.get("user_id")
+    access_token = get_session_access_token()
     print(f"Playlist ID: {playlist_id}, User ID: {user_id}, Access Token exists: {bool(access_token)}")
     
     if not playlist_id or not user_id or not access_token:
@@ -243,7 +237,7 @@ def create_playlist(user_name=None):
         session["mailing_list"] = mailing_list
         current_app.logger.info(f"Username {user_name} stored in session")
 
-        access_token = session.get("access_token")
+        access_token = get_session_access_token()
         current_app.logger.debug(f"Access token: {access_token}")
         if not access_token:
             # If no access token, we need to start the Spotify authorization flow
@@ -259,7 +253,7 @@ def create_playlist(user_name=None):
         return create_playlist_internal(access_token, user_name, mailing_list)
 
     # Handle GET requests (including callback redirects)
-    access_token = session.get("access_token")
+    access_token = get_session_access_token()
     user_profile = session.get("user_profile")
 
     if not access_token or not user_profile:
@@ -273,7 +267,9 @@ def create_playlist(user_name=None):
 
 def create_playlist_internal(access_token, user_name, mailing_list):
     try:
-        user_details = g.services['user_service'].get_user_details(access_token)
+        user_details = g.services['user_service'].get_user_details(
+            access_token, spotify_user_id=session.get("spotify_user_id")
+        )
         current_app.logger.debug(f"User details: {user_details}")
         if not user_details or "id" not in user_details:
             current_app.logger.error("Invalid user details.")
@@ -292,14 +288,18 @@ def create_playlist_internal(access_token, user_name, mailing_list):
         current_app.logger.info(f"Playlist created with ID: {playlist_id}")
         current_app.logger.debug(f"Session data: {session.items()}")
 
-        user_data = UserData(
-            user_id=user_id, access_token=access_token, mailing_list=mailing_list
-        )
+        user_values = {
+            "access_token": access_token,
+            "refresh_token": get_session_refresh_token(),
+            "mailing_list": mailing_list,
+        }
         if mailing_list:
-            user_data.email = user_details.get("email")
-        db.session.add(user_data)
-        db.session.commit()
-        current_app.logger.debug(f"User data stored in database for user_id: {user_id}")
+            user_values["email"] = user_details.get("email")
+        if upsert_user_data(user_id, **user_values):
+            db.session.commit()
+            current_app.logger.debug(f"User data stored in database for user_id: {user_id}")
+        else:
+            current_app.logger.warning(f"No refresh token for new user_id {user_id}; user data not stored")
 
         return redirect(url_for("main_flow_bp.loading"))
     except Exception as e:
@@ -310,7 +310,7 @@ def create_playlist_internal(access_token, user_name, mailing_list):
 @main_flow_bp.route("/process_main_flow", methods=["POST"])
 def process_main_flow():
     current_app.logger.info("Processing the main flow")
-    access_token = session.get("access_token")
+    access_token = get_session_access_token()
     current_app.logger.debug(f"Access token: {access_token}")
     if not access_token:
         current_app.logger.error("Access token is missing.")
@@ -341,17 +341,18 @@ def process_main_flow():
             current_app.logger.info(f"Playlist created with ID: {playlist_id}")
 
         # Store user data in the database
-        user_data = UserData(
-            user_id=user_id,
-            access_token=access_token,
-            refresh_token=session.get('refresh_token'),
-            mailing_list=session.get('mailing_list', False),
-            spotify_subscribe=session.get('spotify_subscribe', False)
-        )
-        if user_data.mailing_list:
-            user_data.email = user_details.get("email")
-        db.session.add(user_data)
-        db.session.commit()
+        user_values = {
+            "access_token": access_token,
+            "refresh_token": get_session_refresh_token(),
+            "mailing_list": session.get('mailing_list', False),
+            "spotify_subscribe": session.get('spotify_subscribe', False),
+        }
+        if user_values["mailing_list"]:
+            user_values["email"] = user_details.get("email")
+        if upsert_user_data(user_id, **user_values):
+            db.session.commit()
+        else:
+            current_app.logger.warning(f"No refresh token for new user_id {user_id}; user data not stored")
 
         current_app.logger.debug(f"Session data: {session.items()}")
         session.clear()
@@ -361,44 +362,58 @@ def process_main_flow():
         session.clear()
         return "Error processing main flow", 500
 
-@main_flow_bp.route("/create_playlist_background/<playlist_id>")
-def create_playlist_background(playlist_id):
-    access_token = g.services['spotify_service'].get_access_token(session.get("user_id"))
-    playlist_name = session.get("playlist_name")
-    artist_playlist_id = "6Z8G9W9F4pCGon5iEJI2ly"
-
-    try:
-        current_app.logger.info(f"Starting playlist creation for {playlist_id}")
-        current_app.logger.debug(f"Access token: {access_token[:10]}... (truncated)")
-        current_app.logger.debug(f"Playlist name: {playlist_name}")
+def ensure_build_job(playlist_id):
+    """Return the playlist's build job state, queueing the build on first sight.
 
-        final_tracks = g.services['spotify_service'].build_and_shuffle_playlist(
-            playlist_id, artist_playlist_id, access_token
-        )
-        current_app.logger.info(f"Built and shuffled playlist. Tracks: {len(final_tracks)}")
+    The worker retries a failed build itself, so "failed" means its attempts are used up.
+    """
+    queue = get_playlist_build_queue()
+    state = queue.state(playlist_id)
+    if state is not None:
+        return state
 
-        g.services['spotify_service'].add_tracks_to_playlist(playlist_id, final_tracks, access_token)
-        current_app.logger.info("Added tracks to playlist")
+    user_id = session.get("user_id")
+    if not user_id or session.get("playlist_id") != playlist_id:
+        current_app.logger.error(f"No build job and no session for playlist {playlist_id}")
+        return None
+    payload = {"user_id": user_id, "playlist_name": session.get("playlist_name")}
+    if queue.enqueue(playlist_id, payload):
+        BuildProgress(current_app.redis_client).publish(playlist_id, "queued")
+        current_app.logger.info(f"Queued playlist build for {playlist_id}")
+    return "queued"
 
-        image_data = g.services['image_service'].create_image(playlist_name, session.get("user_id"))
-        if image_data:
-            g.services['spotify_service'].upload_playlist_cover_image(playlist_id, image_data, access_token)
-            current_app.logger.info("Uploaded playlist cover image")
-        else:
-            current_app.logger.warning("No image data generated")
+@main_flow_bp.route("/create_playlist_background/<playlist_id>")
+def create_playlist_background(playlist_id):
+    state = ensure_build_job(playlist_id)
+    if state is None:
+        return jsonify({"status": "error"}), 404
 
-        g.services['spotify_service'].follow_artist(access_token, "2lZ09YCpdWMMmBTSdDqspr")
-        current_app.logger.info("Followed artist")
+    status = BUILD_STATUSES.get(state, "in_progress")
+    playlist_url = f"https://open.spotify.com/playlist/{playlist_id}"
+    return jsonify({"status": status, "playlist_url": playlist_url})
 
-        playlist_statuses[playlist_id] = "ready"
-        current_app.logger.info("Playlist creation completed successfully")
-    except Exception as e:
-        current_app.logger.error(f"Error in creating playlist: {str(e)}", exc_info=True)
-        playlist_statuses[playlist_id] = "error"
+@main_flow_bp.route("/create_playlist_stream/<playlist_id>")
+def create_playlist_stream(playlist_id):
+    if ensure_build_job(playlist_id) is None:
+        return jsonify({"status": "error"}), 404
 
-    status = playlist_statuses.get(playlist_id, "in_progress")
+    progress = BuildProgress(current_app.redis_client)
     playlist_url = f"https://open.spotify.com/playlist/{playlist_id}"
-    return jsonify({"status": status, "playlist_url": playlist_url})
+    timeout = current_app.config["BUILD_PROGRESS_STREAM_TIMEOUT"]
+
+    def events():
+        for stage in progress.stream(playlist_id, timeout=timeout):
+            if stage is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = {"stage": stage, "playlist_url": playlist_url}
+            yield f"event: stage\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @main_flow_bp.route("/playlist_created")
 def playlist_created():
@@ -406,15 +421,22 @@ def playlist_created():
     if not playlist_url or not isinstance(playlist_url, str):
         current_app.logger.error(f"Invalid playlist URL: {playlist_url}")
         return redirect(url_for("main_flow_bp.index"))
-    user_id = session.get("user_profile", {}).get("id")
-    access_token = session.get("access_token")
-    refresh_token = session.get("refresh_token")
+    spotify_user_id = session.get("spotify_user_id")
+    token_key = session.get("user_id")
     mailing_list = session.get("mailing_list", False)
     spotify_subscribe = session.get("spotify_subscribe", False)
 
-    if user_id and access_token:
-        from store_user_data import store_user_data
-        store_user_data(user_id, access_token, refresh_token, mailing_list, spotify_subscribe)
+    if spotify_user_id and token_key:
+        # The worker fetches and stores the user's data; the page doesn't wait on Spotify
+        from store_user_data import get_user_data_queue
+        get_user_data_queue().enqueue(
+            spotify_user_id,
+            {
+                "token_key": token_key,
+                "mailing_list": mailing_list,
+                "spotify_subscribe": spotify_subscribe,
+            },
+        )
 
     return render_template("playlist_created.html", playlist_url=playlist_url)
 
@@ -430,7 +452,7 @@ def static_files(filename):
 
 @main_flow_bp.route("/delete_user_data", methods=["GET", "POST"])
 def delete_user_data():
-    user_id = session.get("user_profile", {}).get("id")
+    user_id = session.get("spotify_user_id")
     current_app.logger.info(f"Deleting data for user_id: {user_id}")
 
     if not user_id:
@@ -454,23 +476,21 @@ def delete_user_data():
     # Check if the user is being redirected after re-authentication
     if session.pop("delete_user_data", False):
         # Delete the user's data
-        user_data = UserData.query.filter_by(user_id=user_id).first()
-        current_app.logger.info(f"Retrieved user data: {user_data}")
-
-        if user_data:
-            try:
-                db.session.delete(user_data)
-                db.session.commit()
-                current_app.logger.info(f"Deleted data for user_id: {user_id}")
-            except Exception as e:
-                current_app.logger.error(f"Error deleting user data: {e}")
-                db.session.rollback()
-                return "Error deleting user data", 500
+        try:
+            deleted = UserData.query.filter_by(user_id=user_id).delete()
+            db.session.commit()
+        except Exception as e:
+            current_app.logger.error(f"Error deleting user data: {e}")
+            db.session.rollback()
+            return "Error deleting user data", 500
+
+        if deleted:
+            current_app.logger.info(f"Deleted data for user_id: {user_id}")
         else:
             current_app.logger.warning(f"No data found for user_id: {user_id}")
 
         # Revoke the app's access token
-        access_token = session.get("access_token")
+        access_token = get_session_access_token()
         current_app.logger.info(f"Access token: {access_token}")
 
         if access_token:
@@ -482,6 +502,7 @@ def delete_user_data():
         else:
             current_app.logger.warning("No access token found in the session")
 
+        g.services['spotify_service'].token_manager.invalidate(user_id)
         session.clear()
         current_app.logger.info("Session cleared")
 
@@ -0,0 +1,127 @@
+import json
+import logging
+import threading
+
+import redis
+
+from config import Config
+from .pagination import iter_items, iter_next_pages
+from .spotify_client import get_spotify_client
+
+logger = logging.getLogger(__name__)
+
+
+class ArtistPlaylistCache:
+    """Server-side copy of a curated playlist's tracks, keyed by its snapshot_id.
+
+    The track list lives in Redis so every worker shares it, and each process
+    keeps an in-memory copy so a build reads it without decoding JSON. Spotify
+    is only asked for the playlist's ``snapshot_id`` once per
+    ``check_interval`` seconds, and the full track list is only paged through
+    again when that snapshot changes.
+    """
+
+    KEY_PREFIX = "spotify:artist_playlist"
+
+    _local = {}
+    _local_lock = threading.Lock()
+
+    def __init__(self, redis_client, check_interval):
+        self.redis_client = redis_client
+        self.check_interval = check_interval
+
+    def _key(self, playlist_id, suffix):
+        return f"{self.KEY_PREFIX}:{playlist_id}:{suffix}"
+
+    def get_tracks(self, playlist_id, access_token):
+        """Return ``[{"uri": ..., "artist_ids": [...]}, ...]`` for the playlist."""
+        try:
+            checked, snapshot_id = self.redis_client.mget(
+                self._key(playlist_id, "checked"), self._key(playlist_id, "snapshot")
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Artist playlist cache unavailable: {e}")
+            checked, snapshot_id = None, None
+        snapshot_id = snapshot_id.decode("utf-8") if snapshot_id else None
+
+        # Without a stored snapshot there is nothing to compare against or store under, so ask again
+        if checked is None or snapshot_id is None:
+            current_snapshot = self._fetch_snapshot_id(playlist_id, access_token)
+            if current_snapshot != snapshot_id:
+                return self._refresh(playlist_id, current_snapshot, access_token)
+            self._mark_checked(playlist_id)
+
+        tracks = self._local_tracks(playlist_id, snapshot_id)
+        if tracks is None:
+            tracks = self._load(playlist_id, snapshot_id)
+        if tracks is None:
+            return self._refresh(playlist_id, snapshot_id, access_token)
+        return tracks
+
+    def _fetch_snapshot_id(self, playlist_id, access_token):
+        response = get_spotify_client().get(
+            f"{Config.SPOTIFY_API_BASE_URL}playlists/{playlist_id}",
+            headers={"Authorization": f"Bearer {access_token}"},
+            params={"fields": "snapshot_id"},
+        )
+        response.raise_for_status()
+        return response.json()["snapshot_id"]
+
+    def _fetch_tracks(self, playlist_id, access_token):
+        pages = iter_next_pages(
+            f"{Config.SPOTIFY_API_BASE_URL}playlists/{playlist_id}/tracks",
+            headers={"Authorization": f"Bearer {access_token}"},
+            params={"fields": "next,items(track(uri,artists(id)))", "limit": 100},
+        )
+        return [
+            {
+                "uri": item["track"]["uri"],
+                "artist_ids": [artist["id"] for artist in item["track"]["artists"]],
+            }
+            for item in iter_items(pages)
+            if item.get("track")
+        ]
+
+    def _refresh(self, playlist_id, snapshot_id, access_token):
+        tracks = self._fetch_tracks(playlist_id, access_token)
+        logger.info(f"Refreshed artist playlist {playlist_id} at snapshot {snapshot_id}: {len(tracks)} tracks")
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.set(self._key(playlist_id, "tracks"), json.dumps({"snapshot_id": snapshot_id, "tracks": tracks}))
+            pipe.set(self._key(playlist_id, "snapshot"), snapshot_id)
+            pipe.set(self._key(playlist_id, "checked"), 1, ex=self.check_interval)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not store artist playlist {playlist_id}: {e}")
+        self._store_local(playlist_id, snapshot_id, tracks)
+        return tracks
+
+    def _mark_checked(self, playlist_id):
+        try:
+            self.redis_client.set(self._key(playlist_id, "checked"), 1, ex=self.check_interval)
+        except redis.RedisError as e:
+            logger.warning(f"Could not mark artist playlist {playlist_id} as checked: {e}")
+
+    def _load(self, playlist_id, snapshot_id):
+        try:
+            raw = self.redis_client.get(self._key(playlist_id, "tracks"))
+        except redis.RedisError as e:
+            logger.warning(f"Could not load artist playlist {playlist_id}: {e}")
+            return None
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        if data["snapshot_id"] != snapshot_id:
+            return None
+        self._store_local(playlist_id, snapshot_id, data["tracks"])
+        return data["tracks"]
+
+    def _local_tracks(self, playlist_id, snapshot_id):
+        cached = self._local.get(playlist_id)
+        if snapshot_id is not None and cached is not None and cached[0] == snapshot_id:
+            return cached[1]
+        return None
+
+    def _store_local(self, playlist_id, snapshot_id, tracks):
+        with self._local_lock:
+            self._local[playlist_id] = (snapshot_id, tracks)
@@ -0,0 +1,76 @@
+import json
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+AUDIO_FEATURE_FIELDS = (
+    "danceability",
+    "energy",
+    "key",
+    "loudness",
+    "mode",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+    "duration_ms",
+    "time_signature",
+)
+
+# Stored for tracks Spotify has no features for, so they are not re-requested every build
+UNAVAILABLE = b"null"
+
+
+class AudioFeaturesStore:
+    """Durable Redis store of Spotify audio features keyed by track ID.
+
+    A track's audio features never change, so stored vectors have no TTL.
+    Tracks Spotify returned no features for are remembered for
+    ``unavailable_ttl`` seconds before being asked about again.
+    """
+
+    KEY_PREFIX = "spotify:audio_features"
+
+    def __init__(self, redis_client, unavailable_ttl):
+        self.redis_client = redis_client
+        self.unavailable_ttl = unavailable_ttl
+
+    def _key(self, track_id):
+        return f"{self.KEY_PREFIX}:{track_id}"
+
+    def get_many(self, track_ids):
+        """Return ``(features_by_track, missing_ids)`` for the given unique IDs."""
+        if not track_ids:
+            return {}, []
+        try:
+            values = self.redis_client.mget([self._key(track_id) for track_id in track_ids])
+        except redis.RedisError as e:
+            logger.warning(f"Audio features store unavailable: {e}")
+            return {}, list(track_ids)
+
+        found = {}
+        missing = []
+        for track_id, value in zip(track_ids, values):
+            if value is None:
+                missing.append(track_id)
+            elif value != UNAVAILABLE:
+                found[track_id] = {"id": track_id, **json.loads(value)}
+        return found, missing
+
+    def set_many(self, features_by_track, unavailable_ids=()):
+        if not features_by_track and not unavailable_ids:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for track_id, features in features_by_track.items():
+                vector = {field: features.get(field) for field in AUDIO_FEATURE_FIELDS}
+                pipe.set(self._key(track_id), json.dumps(vector, separators=(",", ":")))
+            for track_id in unavailable_ids:
+                pipe.set(self._key(track_id), UNAVAILABLE, ex=self.unavailable_ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not store audio features: {e}")
@@ -0,0 +1,97 @@
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import current_app
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _is_retryable(error):
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+class BatchExecutor:
+    """Fans fixed-size ID batches out over a shared, capped thread pool.
+
+    ``fetch_batch`` receives one batch of IDs and returns a dict; the dicts of
+    every batch are merged. Batches that fail with a connection error, a 429
+    or a 5xx are retried with exponential backoff instead of being skipped;
+    a batch is only left out after its last retry fails.
+    """
+
+    def __init__(self, max_workers, batch_size=50, retries=2, backoff=0.5):
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spotify-batch")
+
+    def _run_batch(self, fetch_batch, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                return fetch_batch(batch)
+            except requests.exceptions.RequestException as e:
+                if attempt >= self.retries or not _is_retryable(e):
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(f"Batch of {len(batch)} IDs failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        return {}
+
+    def run(self, fetch_batch, ids):
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        futures = [self._executor.submit(self._run_batch, fetch_batch, batch) for batch in batches]
+        merged = {}
+        for number, future in enumerate(futures, start=1):
+            try:
+                merged.update(future.result())
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Batch {number} of {len(batches)} failed after {self.retries + 1} attempts: {e}")
+        return merged
+
+
+def with_app_context(fn):
+    """Wrap ``fn`` so it runs inside the current app's context on another thread."""
+    app = current_app._get_current_object()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_batch_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BatchExecutor(
+                    max_workers=Config.SPOTIFY_BATCH_CONCURRENCY,
+                    retries=Config.SPOTIFY_BATCH_RETRIES,
+                )
+    return _executor
+
+
+def _reset_executor():
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor)
@@ -0,0 +1,83 @@
+import json
+import time
+
+# Build stages in the order the worker reaches them
+STAGES = ("queued", "tracks_fetched", "filtered", "tracks_added", "cover_uploaded", "ready")
+TERMINAL_STAGES = ("ready", "error")
+
+# Record and announce a stage, unless the build already reached a terminal stage.
+# Only "queued" (a new attempt) may replace a terminal stage.
+PUBLISH_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and ARGV[3] ~= 'queued' then
+    local stage = cjson.decode(current)['stage']
+    if stage == ARGV[4] or stage == ARGV[5] then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('PUBLISH', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class BuildProgress:
+    """Playlist build stage transitions, pushed over Redis pub/sub.
+
+    The latest stage is also kept in a key so a subscriber that connects
+    late (or to a different web worker than the one that queued the build)
+    starts from the current stage rather than waiting for the next one.
+    Once a build is ready or failed, stragglers (such as an abandoned stage
+    thread) can't move it back to an earlier stage.
+    """
+
+    KEY_PREFIX = "playlist_progress"
+
+    def __init__(self, redis_client, ttl=3600):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self._publish = redis_client.register_script(PUBLISH_SCRIPT)
+
+    def _key(self, playlist_id):
+        return f"{self.KEY_PREFIX}:{playlist_id}"
+
+    def publish(self, playlist_id, stage):
+        """Record and announce ``stage``; returns False if the build had already finished."""
+        message = json.dumps({"stage": stage, "at": time.time()})
+        published = self._publish(
+            keys=[self._key(playlist_id)], args=[message, self.ttl, stage, *TERMINAL_STAGES]
+        )
+        return bool(published)
+
+    def current(self, playlist_id):
+        raw = self.redis_client.get(self._key(playlist_id))
+        return json.loads(raw)["stage"] if raw else None
+
+    def stream(self, playlist_id, timeout, heartbeat=15):
+        """Yield stages as they happen until a terminal stage or ``timeout`` seconds.
+
+        ``None`` is yielded every ``heartbeat`` seconds without news, so the
+        caller can keep the connection alive.
+        """
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._key(playlist_id))
+        try:
+            # Subscribe before reading the current stage so no transition slips between the two
+            stage = self.current(playlist_id)
+            if stage is not None:
+                yield stage
+                if stage in TERMINAL_STAGES:
+                    return
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=max(0, min(heartbeat, deadline - time.monotonic())))
+                if message is None:
+                    yield None
+                    continue
+                stage = json.loads(message["data"])["stage"]
+                yield stage
+                if stage in TERMINAL_STAGES:
+                    return
+        finally:
+            pubsub.close()
@@ -0,0 +1,72 @@
+import threading
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+_engine_lock = threading.Lock()
+
+
+def analytics_engine():
+    bind = current_app.config.get("DATABASE_ANALYTICS_BIND") or None
+    if bind is not None:
+        return db.engines[bind]
+    # No follower configured: read the default database, but through a pool of its own
+    engine = current_app.extensions.get("analytics_engine")
+    if engine is None:
+        with _engine_lock:
+            engine = current_app.extensions.get("analytics_engine")
+            if engine is None:
+                engine = create_engine(db.engine.url, **current_app.config["DATABASE_ANALYTICS_ENGINE_OPTIONS"])
+                current_app.extensions["analytics_engine"] = engine
+    return engine
+
+
+@contextmanager
+def analytics_session():
+    """Read-only session for reporting and export queries.
+
+    It runs on the analytics bind, or on a separate small pool over the
+    default database when no follower is configured, so heavy reads never
+    hold connections from the default bind's pool, which serves the
+    user-facing writes. Writes and read-your-writes lookups stay on
+    ``db.session``.
+    """
+    session = Session(bind=analytics_engine().execution_options(postgresql_readonly=True))
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _pool_stats(engine, roles):
+    pool = engine.pool
+    stats = {
+        "url": engine.url.render_as_string(hide_password=True),
+        "roles": roles,
+        "status": pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
+def pool_metrics():
+    """Connection pool usage of every bind, keyed by bind name, plus the analytics pool."""
+    analytics_bind = current_app.config.get("DATABASE_ANALYTICS_BIND") or None
+    metrics = {}
+    for bind, engine in db.engines.items():
+        roles = (["writes"] if bind is None else []) + (["analytics"] if analytics_bind and bind == analytics_bind else [])
+        metrics[bind or "default"] = _pool_stats(engine, roles)
+    if analytics_bind is None:
+        metrics["analytics"] = _pool_stats(analytics_engine(), ["analytics"])
+    return metrics
@@ -0,0 +1,76 @@
+import json
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class ArtistGenreCache:
+    """Shared Redis cache of Spotify artist ID -> genre list.
+
+    Lookups are a single MGET for the whole batch, and hit/miss counters are
+    kept both on the instance (per build) and in a Redis hash (cluster-wide).
+    """
+
+    KEY_PREFIX = "spotify:artist_genres"
+    METRICS_KEY = "spotify:artist_genres:metrics"
+
+    def __init__(self, redis_client, ttl):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, artist_id):
+        return f"{self.KEY_PREFIX}:{artist_id}"
+
+    def get_many(self, artist_ids):
+        """Return ``(genres_by_artist, missing_ids)`` for the given unique IDs."""
+        if not artist_ids:
+            return {}, []
+        try:
+            values = self.redis_client.mget([self._key(artist_id) for artist_id in artist_ids])
+        except redis.RedisError as e:
+            logger.warning(f"Artist genre cache unavailable: {e}")
+            return {}, list(artist_ids)
+
+        found = {}
+        missing = []
+        for artist_id, value in zip(artist_ids, values):
+            if value is None:
+                missing.append(artist_id)
+            else:
+                found[artist_id] = json.loads(value)
+
+        self._record(len(found), len(missing))
+        return found, missing
+
+    def set_many(self, genres_by_artist):
+        if not genres_by_artist:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for artist_id, genres in genres_by_artist.items():
+                pipe.set(self._key(artist_id), json.dumps(genres), ex=self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not store artist genres: {e}")
+
+    def _record(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hincrby(self.METRICS_KEY, "hits", hits)
+            pipe.hincrby(self.METRICS_KEY, "misses", misses)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not record artist genre cache metrics: {e}")
+
+    def get_metrics(self):
+        raw = self.redis_client.hgetall(self.METRICS_KEY)
+        metrics = {field.decode("utf-8"): int(value) for field, value in raw.items()}
+        lookups = metrics.get("hits", 0) + metrics.get("misses", 0)
+        metrics["hit_rate"] = metrics.get("hits", 0) / lookups if lookups else 0.0
+        return metrics
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+
+import redis
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SEPARATORS = re.compile(r"[\s\-]+")
+
+
+def tokenize(genre):
+    return tuple(token for token in TOKEN_SEPARATORS.split(genre.strip().lower()) if token)
+
+
+class _Automaton:
+    """Aho-Corasick automaton over sequences of hashable symbols.
+
+    Built once from every pattern, it answers "does this sequence contain any
+    of the patterns?" in a single pass over the sequence. Used over characters
+    for substring rules and over tokens for token rules.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.terminal = [False]
+        for pattern in patterns:
+            if pattern:
+                self._insert(pattern)
+        self._link()
+
+    def _insert(self, pattern):
+        state = 0
+        for symbol in pattern:
+            if symbol not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.terminal.append(False)
+                self.goto[state][symbol] = len(self.goto) - 1
+            state = self.goto[state][symbol]
+        self.terminal[state] = True
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for symbol, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and symbol not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                candidate = self.goto[fallback].get(symbol, 0)
+                self.fail[child] = candidate if candidate != child else 0
+                # A state matches if any of its suffixes is a whole pattern
+                self.terminal[child] = self.terminal[child] or self.terminal[self.fail[child]]
+                queue.append(child)
+
+    def search(self, sequence):
+        state = 0
+        for symbol in sequence:
+            while state and symbol not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(symbol, 0)
+            if self.terminal[state]:
+                return True
+        return False
+
+
+class GenreMatcher:
+    """Compiled genre exclusion rules.
+
+    * ``exact`` rules match a genre equal to the rule.
+    * ``tokens`` rules match a genre containing the rule's words as a run, so
+      "rap" matches "emo rap" and "rap rock" but not "trap".
+    * ``substrings`` rules match anywhere in the genre name.
+
+    Verdicts are memoised in a process-wide LRU; ``fingerprint`` identifies
+    the rule set so shared caches never mix verdicts of different rules.
+    """
+
+    def __init__(self, exact=(), tokens=(), substrings=(), cache_size=8192):
+        self.exact = frozenset(genre.strip().lower() for genre in exact)
+        self.tokens = _Automaton(tokenize(rule) for rule in tokens)
+        self.substrings = _Automaton(rule.lower() for rule in substrings)
+        self.fingerprint = hashlib.sha1(
+            json.dumps(
+                {
+                    "exact": sorted(self.exact),
+                    "tokens": sorted(" ".join(tokenize(rule)) for rule in tokens),
+                    "substrings": sorted(rule.lower() for rule in substrings),
+                }
+            ).encode("utf-8")
+        ).hexdigest()[:12]
+        self.cache_size = cache_size
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def evaluate(self, genre):
+        name = genre.strip().lower()
+        return (
+            name in self.exact
+            or self.tokens.search(tokenize(name))
+            or self.substrings.search(name)
+        )
+
+    def cached(self, genre):
+        """The memoised verdict for ``genre``, or None if it hasn't been seen."""
+        with self._lock:
+            verdict = self._verdicts.get(genre)
+            if verdict is not None:
+                self._verdicts.move_to_end(genre)
+            return verdict
+
+    def remember(self, verdicts):
+        with self._lock:
+            self._verdicts.update(verdicts)
+            for genre in verdicts:
+                self._verdicts.move_to_end(genre)
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+
+    def matches(self, genre):
+        verdict = self.cached(genre)
+        if verdict is None:
+            verdict = self.evaluate(genre)
+            self.remember({genre: verdict})
+        return verdict
+
+
+class GenreVerdictCache:
+    """Genre exclusion verdicts shared across processes through Redis.
+
+    Lookups go to the matcher's in-process LRU first, then to one HMGET on a
+    hash keyed by the rules fingerprint; only genres nobody has seen under
+    the current rules are evaluated, and their verdicts are written back.
+    """
+
+    KEY_PREFIX = "spotify:genre_verdicts"
+
+    def __init__(self, matcher, redis_client, ttl=30 * 24 * 3600):
+        self.matcher = matcher
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.key = f"{self.KEY_PREFIX}:{matcher.fingerprint}"
+
+    def resolve(self, genres):
+        """Return ``{genre: excluded}`` for the given genres."""
+        verdicts = {}
+        unseen = []
+        for genre in set(genres):
+            verdict = self.matcher.cached(genre)
+            if verdict is None:
+                unseen.append(genre)
+            else:
+                verdicts[genre] = verdict
+        if not unseen:
+            return verdicts
+
+        shared = {}
+        try:
+            for genre, value in zip(unseen, self.redis_client.hmget(self.key, unseen)):
+                if value is not None:
+                    shared[genre] = value == b"1"
+        except redis.RedisError as e:
+            logger.warning(f"Genre verdict cache unavailable: {e}")
+
+        evaluated = {genre: self.matcher.evaluate(genre) for genre in unseen if genre not in shared}
+        if evaluated:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.hset(self.key, mapping={genre: int(verdict) for genre, verdict in evaluated.items()})
+                pipe.expire(self.key, self.ttl)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Could not store genre verdicts: {e}")
+
+        self.matcher.remember({**shared, **evaluated})
+        verdicts.update(shared)
+        verdicts.update(evaluated)
+        return verdicts
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_genre_matcher():
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = GenreMatcher(
+                    exact=Config.EXCLUDED_GENRES_EXACT,
+                    tokens=Config.EXCLUDED_GENRES,
+                    substrings=Config.EXCLUDED_GENRES_SUBSTRING,
+                )
+    return _matcher
+
+
+def _reset_matcher_lock():
+    # The compiled rules and verdicts stay valid in a forked child; only the locks must not be inherited held
+    global _matcher_lock
+    _matcher_lock = threading.Lock()
+    if _matcher is not None:
+        _matcher._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_matcher_lock)
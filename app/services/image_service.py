@@ -11,15 +11,17 @@ class ImageService:
     USER_TEXT_WIDTH_PERCENT = 0.8
     USER_TEXT_VERTICAL_POSITION_PERCENT = 0.10
 
-    def __init__(self, static_folder):
+    def __init__(self, static_folder, redis_client=None):
         self.FONT_PATH_LACQUER = os.path.join(static_folder, "fonts", "Lacquer-Regular.ttf")
         self.FONT_PATH_NEW_SPIRIT = os.path.join(static_folder, "fonts", "NewSpiritSemiBoldCondensed.otf")
         
         self.font_lacquer = self._load_font(self.FONT_PATH_LACQUER, "Lacquer", 130)
         self.font_new_spirit = self._load_font(self.FONT_PATH_NEW_SPIRIT, "New Spirit", 1)
 
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        self.redis_client = redis.from_url(redis_url)
+        if redis_client is None:
+            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+            redis_client = redis.from_url(redis_url)
+        self.redis_client = redis_client
 
     def _load_font(self, font_path, font_name, default_size):
         try:
@@ -0,0 +1,211 @@
+import json
+import time
+
+from .status_store import STATE_CODES, TRANSITIONS, StatusStore
+
+# Create the job record and queue it only if the job has no status yet (or failed before),
+# counting attempts
+ENQUEUE_SCRIPT = """
+local current = redis.call('GET', KEYS[1]) or '-'
+if string.find(ARGV[5], current, 1, true) == nil then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[6], 'EX', ARGV[4])
+redis.call('HSET', KEYS[2], 'payload', ARGV[2], 'enqueued_at', ARGV[3])
+redis.call('HINCRBY', KEYS[2], 'attempts', 1)
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('LPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+
+# Requeue jobs whose lease ran out: their worker died (or was redeployed) mid-job.
+# A job seen in the processing list without a lease gets one first, which covers a
+# worker that died between moving the job and claiming it.
+REQUEUE_STALE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local requeued = 0
+for _, job_id in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    local deadline = redis.call('ZSCORE', KEYS[2], job_id)
+    if not deadline then
+        redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), job_id)
+    elseif tonumber(deadline) <= now then
+        local status_key = ARGV[3] .. job_id
+        local status = redis.call('GET', status_key)
+        redis.call('LREM', KEYS[1], 0, job_id)
+        redis.call('ZREM', KEYS[2], job_id)
+        if status == ARGV[5] or status == ARGV[6] then
+            redis.call('SET', status_key, ARGV[5], 'EX', ARGV[4])
+            redis.call('RPUSH', KEYS[3], job_id)
+            requeued = requeued + 1
+        end
+    end
+end
+return requeued
+"""
+
+# Record a failed attempt: queue the job again while it has attempts left, else mark it failed.
+# Returns 1 if requeued, 0 if failed for good, -1 if the job's status didn't allow failing it.
+FAIL_SCRIPT = """
+local current = redis.call('GET', KEYS[1]) or '-'
+if string.find(ARGV[6], current, 1, true) == nil then
+    return -1
+end
+redis.call('HSET', KEYS[2], 'error', ARGV[3], 'finished_at', ARGV[4])
+local attempts = tonumber(redis.call('HGET', KEYS[2], 'attempts') or '1')
+if attempts < tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[1], ARGV[7], 'EX', ARGV[5])
+    redis.call('HINCRBY', KEYS[2], 'attempts', 1)
+    redis.call('LPUSH', KEYS[3], ARGV[1])
+    return 1
+end
+redis.call('SET', KEYS[1], ARGV[8], 'EX', ARGV[5])
+return 0
+"""
+
+
+class JobQueue:
+    """Idempotent Redis-backed job queue.
+
+    Each job is identified by a caller-chosen ID (a playlist ID for builds),
+    and enqueueing an ID that already has a job is a no-op, so however many
+    times a page polls, the work runs once. Job state lives in a
+    ``StatusStore``, so reading it is O(1); the payload sits in its own hash.
+
+    Reserving moves a job into a processing list and gives it a lease of
+    ``visibility_timeout`` seconds, so a job whose worker dies is never lost:
+    ``requeue_stale`` puts it back on the queue once the lease runs out. A
+    failed job goes back on the queue until it has run ``max_attempts`` times.
+    """
+
+    def __init__(self, redis_client, name, job_ttl=24 * 3600, visibility_timeout=600, max_attempts=1):
+        self.redis_client = redis_client
+        self.name = name
+        self.job_ttl = job_ttl
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.queue_key = f"jobs:{name}:queue"
+        self.processing_key = f"jobs:{name}:processing"
+        self.leases_key = f"jobs:{name}:leases"
+        self.statuses = StatusStore(redis_client, name, ttl=job_ttl)
+        self._enqueue = redis_client.register_script(ENQUEUE_SCRIPT)
+        self._requeue_stale = redis_client.register_script(REQUEUE_STALE_SCRIPT)
+        self._fail = redis_client.register_script(FAIL_SCRIPT)
+
+    def _job_key(self, job_id):
+        return f"jobs:{self.name}:{job_id}"
+
+    def enqueue(self, job_id, payload):
+        """Queue ``payload`` under ``job_id``; returns False if the job already exists."""
+        created = self._enqueue(
+            keys=[self.statuses.key(job_id), self._job_key(job_id), self.queue_key],
+            args=[
+                job_id,
+                json.dumps(payload),
+                int(time.time()),
+                self.job_ttl,
+                TRANSITIONS["queued"],
+                STATE_CODES["queued"],
+            ],
+        )
+        return bool(created)
+
+    def state(self, job_id):
+        return self.statuses.get(job_id)
+
+    def get(self, job_id):
+        state = self.statuses.get(job_id)
+        if state is None:
+            return None
+        raw = self.redis_client.hgetall(self._job_key(job_id))
+        job = {field.decode("utf-8"): value.decode("utf-8") for field, value in raw.items()}
+        job["payload"] = json.loads(job.get("payload", "{}"))
+        job["state"] = state
+        return job
+
+    def reserve(self, timeout=5):
+        """Wait up to ``timeout`` seconds for the next job; returns ``(job_id, payload)`` or None.
+
+        A ``timeout`` of 0 checks the queue without blocking.
+        """
+        if timeout:
+            item = self.redis_client.blmove(self.queue_key, self.processing_key, timeout, "RIGHT", "LEFT")
+        else:
+            item = self.redis_client.lmove(self.queue_key, self.processing_key, "RIGHT", "LEFT")
+        if item is None:
+            return None
+        return self._claim(item.decode("utf-8"))
+
+    def _claim(self, job_id):
+        # Only one worker can move a job from queued to running
+        if not self.statuses.transition(job_id, "running"):
+            self._release(job_id)
+            return None
+        self.redis_client.zadd(self.leases_key, {job_id: time.time() + self.visibility_timeout})
+        job = self.get(job_id)
+        self.redis_client.hset(self._job_key(job_id), "started_at", int(time.time()))
+        return job_id, job["payload"]
+
+    def _release(self, job_id):
+        pipe = self.redis_client.pipeline()
+        pipe.lrem(self.processing_key, 0, job_id)
+        pipe.zrem(self.leases_key, job_id)
+        pipe.execute()
+
+    def complete(self, job_id):
+        self.statuses.transition(job_id, "done")
+        self.redis_client.hset(self._job_key(job_id), "finished_at", int(time.time()))
+        self._release(job_id)
+
+    def fail(self, job_id, error):
+        """Record a failed run; returns True if the job was queued for another attempt."""
+        requeued = self._fail(
+            keys=[self.statuses.key(job_id), self._job_key(job_id), self.queue_key],
+            args=[
+                job_id,
+                self.max_attempts,
+                str(error)[:500],
+                int(time.time()),
+                self.job_ttl,
+                TRANSITIONS["failed"],
+                STATE_CODES["queued"],
+                STATE_CODES["failed"],
+            ],
+        )
+        self._release(job_id)
+        return requeued == 1
+
+    def requeue_stale(self):
+        """Put jobs whose lease expired back on the queue; returns how many were requeued."""
+        return self._requeue_stale(
+            keys=[self.processing_key, self.leases_key, self.queue_key],
+            args=[
+                time.time(),
+                self.visibility_timeout,
+                self.statuses.key(""),
+                self.job_ttl,
+                STATE_CODES["queued"],
+                STATE_CODES["running"],
+            ],
+        )
+
+
+def reserve_any(queues, timeout=5, poll_interval=1):
+    """Wait up to ``timeout`` seconds for a job from any of ``queues``.
+
+    Returns ``(queue, job_id, payload)`` or None. Queues are checked in the
+    order given, so put latency-sensitive ones first; while all are empty,
+    the first queue is waited on in ``poll_interval`` slices.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        for queue in queues:
+            job = queue.reserve(timeout=0)
+            if job:
+                return (queue,) + job
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        # BLMOVE takes whole seconds here; never pass 0, which would block forever
+        job = queues[0].reserve(timeout=max(1, min(poll_interval, int(remaining))))
+        if job:
+            return (queues[0],) + job
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .spotify_client import get_spotify_client
+
+
+def iter_offset_pages(endpoint, headers, offsets, params=None, max_workers=4, spotify_user_id=None):
+    """Fetch pages whose offsets are known up front concurrently.
+
+    All pages are requested at once and their JSON bodies are yielded in the
+    order of ``offsets``, so the caller sees one round trip of latency instead
+    of one per page. An HTTP error is raised at the position of the failed
+    page, after every earlier page has been yielded.
+    """
+    offsets = list(offsets)
+    if not offsets:
+        return
+    client = get_spotify_client()
+    params = dict(params or {})
+
+    def fetch(offset):
+        response = client.get(
+            endpoint, headers=headers, params={**params, "offset": offset}, spotify_user_id=spotify_user_id
+        )
+        response.raise_for_status()
+        return response.json()
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(offsets)))
+    try:
+        futures = [executor.submit(fetch, offset) for offset in offsets]
+        for future in futures:
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_next_pages(endpoint, headers, params=None, spotify_user_id=None):
+    """Follow Spotify's ``next`` links, yielding one JSON page at a time."""
+    client = get_spotify_client()
+    while endpoint:
+        response = client.get(endpoint, headers=headers, params=params, spotify_user_id=spotify_user_id)
+        response.raise_for_status()
+        data = response.json()
+        yield data
+        # ``next`` already carries the query string of the following page
+        endpoint = data.get("next")
+        params = None
+
+
+def iter_items(pages, key="items"):
+    """Flatten pages into a stream of their items."""
+    for page in pages:
+        yield from page.get(key) or []
@@ -0,0 +1,102 @@
+import threading
+
+from flask import current_app
+
+from config import Config
+
+from .batching import with_app_context
+from .build_progress import BuildProgress
+from .image_service import ImageService
+from .job_queue import JobQueue
+from .redis_client import get_redis_client
+from .spotify_service import SpotifyService
+from .stage_graph import StageGraph
+
+PLAYLIST_BUILD_QUEUE = "playlist_build"
+
+
+def get_playlist_build_queue():
+    return JobQueue(
+        get_redis_client(),
+        PLAYLIST_BUILD_QUEUE,
+        visibility_timeout=Config.JOB_VISIBILITY_TIMEOUT,
+        max_attempts=Config.PLAYLIST_BUILD_MAX_ATTEMPTS,
+    )
+
+
+class PlaylistBuildService:
+    """Fills a freshly created playlist: tracks, cover image and the artist follow.
+
+    Runs in the worker process (see worker.py), never inside a web request.
+    """
+
+    ARTIST_PLAYLIST_ID = "6Z8G9W9F4pCGon5iEJI2ly"
+    FEATURED_ARTIST_ID = "2lZ09YCpdWMMmBTSdDqspr"
+
+    def __init__(self, spotify_service=None, image_service=None, progress=None):
+        self.spotify_service = spotify_service or SpotifyService()
+        self.image_service = image_service or ImageService(current_app.static_folder, get_redis_client())
+        self.progress = progress or BuildProgress(get_redis_client())
+
+    def build(self, playlist_id, user_id, playlist_name):
+        """Run the build as a stage graph, so its latency is the critical path.
+
+        The cover and the artist follow don't depend on the track list, so
+        they run alongside it; they are optional, and failing them does not
+        fail a playlist whose tracks were added.
+        """
+        access_token = self.spotify_service.get_access_token(user_id)
+        if not access_token:
+            raise ValueError(f"No access token available for user {user_id}")
+
+        current_app.logger.info(f"Starting playlist creation for {playlist_id}")
+        current_app.logger.debug(f"Playlist name: {playlist_name}")
+
+        finished = threading.Event()
+
+        def on_stage(stage):
+            # A stage abandoned after its timeout may still report in; the build is over by then
+            if not finished.is_set():
+                self.progress.publish(playlist_id, stage)
+
+        def build_tracks():
+            final_tracks = self.spotify_service.build_and_shuffle_playlist(
+                playlist_id, self.ARTIST_PLAYLIST_ID, access_token, on_stage=on_stage, user_id=user_id
+            )
+            current_app.logger.info(f"Built and shuffled playlist. Tracks: {len(final_tracks)}")
+            return final_tracks
+
+        def add_tracks(final_tracks):
+            # The playlist was just created, so replacing its items is safe to retry
+            if not self.spotify_service.add_tracks_to_playlist(
+                playlist_id, final_tracks, access_token, replace=True
+            ):
+                raise ValueError(f"Failed to add tracks to playlist {playlist_id}")
+            current_app.logger.info("Added tracks to playlist")
+            on_stage("tracks_added")
+
+        def upload_cover():
+            image_data = self.image_service.create_image(playlist_name)
+            if not image_data:
+                current_app.logger.warning("No image data generated")
+                return
+            self.spotify_service.upload_playlist_cover_image(playlist_id, image_data, access_token)
+            current_app.logger.info("Uploaded playlist cover image")
+            on_stage("cover_uploaded")
+
+        def follow_artist():
+            self.spotify_service.follow_artist(access_token, self.FEATURED_ARTIST_ID)
+            current_app.logger.info("Followed artist")
+
+        timeouts = current_app.config["PLAYLIST_STAGE_TIMEOUTS"]
+        graph = StageGraph(max_workers=4)
+        graph.add("tracks", with_app_context(build_tracks), timeout=timeouts["tracks"])
+        graph.add("add_tracks", with_app_context(add_tracks), depends_on=("tracks",), timeout=timeouts["add_tracks"])
+        graph.add("cover", with_app_context(upload_cover), timeout=timeouts["cover"], required=False)
+        graph.add("follow", with_app_context(follow_artist), timeout=timeouts["follow"], required=False)
+        try:
+            graph.run()
+        finally:
+            finished.set()
+
+        current_app.logger.info("Playlist creation completed successfully")
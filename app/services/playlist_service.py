@@ -1,6 +1,9 @@
 import requests
 from flask import current_app
 
+from config import Config
+
+from ..services.spotify_client import get_spotify_client
 from ..services.spotify_service import SpotifyService
 
 
@@ -24,13 +27,13 @@ class PlaylistService:
         description = description.strip()
 
         try:
-            endpoint = f"https://api.spotify.com/v1/users/{user_id}/playlists"
+            endpoint = f"{Config.SPOTIFY_API_BASE_URL}users/{user_id}/playlists"
             headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Content-Type": "application/json",
             }
             payload = {"name": name, "description": description, "public": True}
-            response = requests.post(endpoint, headers=headers, json=payload, timeout=10)
+            response = get_spotify_client().post(endpoint, headers=headers, json=payload, timeout=10)
             response.raise_for_status()
             playlist_data = response.json()
             return playlist_data["id"]
@@ -38,16 +41,22 @@ class PlaylistService:
             current_app.logger.error(f"Failed to create playlist: {e}")
             raise ValueError("Failed to create playlist") from e
 
-    def add_tracks(self, playlist_id, artist_playlist_id, access_token):
+    def add_tracks(self, playlist_id, artist_playlist_id, access_token, fresh=False):
         tracks = self.spotify_api.build_and_shuffle_playlist(
             playlist_id, artist_playlist_id, access_token
         )
         if tracks:
-            current_playlist_tracks = self.spotify_api.get_playlist_tracks(
-                playlist_id, access_token
+            if fresh:
+                # Nothing to diff against: one idempotent replace per 100 tracks
+                self.spotify_api.add_tracks_to_playlist(
+                    playlist_id, tracks, access_token, replace=True
+                )
+                return tracks
+            current_playlist_tracks = set(
+                self.spotify_api.get_playlist_tracks(playlist_id, access_token)
             )
             new_tracks = [
-                track for track in tracks if track not in current_playlist_tracks
+                track for track in dict.fromkeys(tracks) if track not in current_playlist_tracks
             ]
             if new_tracks:
                 self.spotify_api.add_tracks_to_playlist(
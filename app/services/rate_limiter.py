@@ -0,0 +1,152 @@
+import logging
+import math
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import redis
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Refill the bucket from Redis' own clock so every worker agrees on "now".
+# Returns 0 when a token was taken, otherwise the number of milliseconds to wait.
+TOKEN_BUCKET_SCRIPT = """
+local cooldown = redis.call('PTTL', KEYS[2])
+if cooldown > 0 then
+    return cooldown
+end
+
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+
+def endpoint_class(url):
+    """Bucket a Spotify URL into the rate-limit class it is gated by."""
+    if url.startswith(Config.SPOTIFY_ACCOUNTS_BASE_URL):
+        return "accounts"
+    if url.startswith(Config.SPOTIFY_API_BASE_URL):
+        path = url[len(Config.SPOTIFY_API_BASE_URL):]
+    else:
+        path = urlparse(url).path
+    path = path.split("?", 1)[0]
+    parts = [part for part in path.split("/") if part and part != "v1"]
+    if not parts:
+        return "default"
+    if parts[0] == "me" and len(parts) > 1:
+        return f"me/{parts[1]}"
+    return parts[0]
+
+
+def parse_retry_after(value, default=1.0):
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class SpotifyRateLimiter:
+    """Token bucket per endpoint class, shared by every worker through Redis.
+
+    ``limits`` maps an endpoint class (see ``endpoint_class``) to a
+    ``(requests_per_second, burst)`` pair; classes without an entry use the
+    ``"default"`` pair. A 429 puts the whole class on cooldown for the
+    ``Retry-After`` period so no worker keeps hammering Spotify meanwhile.
+    """
+
+    KEY_PREFIX = "spotify:ratelimit"
+
+    def __init__(self, redis_client, limits, max_wait=30.0):
+        self.redis_client = redis_client
+        self.limits = limits
+        self.max_wait = max_wait
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _limit_for(self, endpoint):
+        return self.limits.get(endpoint, self.limits["default"])
+
+    def acquire(self, endpoint):
+        """Block until a call to ``endpoint`` may go out; returns seconds spent waiting."""
+        rate, burst = self._limit_for(endpoint)
+        keys = [f"{self.KEY_PREFIX}:bucket:{endpoint}", f"{self.KEY_PREFIX}:cooldown:{endpoint}"]
+        waited = 0.0
+        while True:
+            try:
+                wait_ms = int(self._script(keys=keys, args=[rate, burst]))
+            except redis.RedisError as e:
+                # Fail open: a Redis outage must not take Spotify calls down with it
+                logger.warning(f"Rate limiter unavailable, sending {endpoint} call ungated: {e}")
+                break
+            if wait_ms <= 0:
+                break
+            if waited >= self.max_wait:
+                logger.warning(f"Waited {waited:.1f}s for a {endpoint} token, sending anyway")
+                break
+            delay = min(wait_ms / 1000, self.max_wait - waited)
+            time.sleep(delay)
+            waited += delay
+
+        if waited:
+            self._record(endpoint, throttled_seconds=waited, throttled_calls=1)
+        return waited
+
+    def penalize(self, endpoint, retry_after):
+        """Pause every worker's calls to ``endpoint`` after Spotify answered 429."""
+        try:
+            self.redis_client.set(
+                f"{self.KEY_PREFIX}:cooldown:{endpoint}",
+                1,
+                px=max(1, math.ceil(retry_after * 1000)),
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not store {endpoint} cooldown: {e}")
+        self._record(endpoint, responses_429=1)
+
+    def _record(self, endpoint, throttled_seconds=0.0, throttled_calls=0, responses_429=0):
+        key = f"{self.KEY_PREFIX}:metrics"
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            if throttled_seconds:
+                pipe.hincrbyfloat(key, f"{endpoint}:throttled_seconds", throttled_seconds)
+            if throttled_calls:
+                pipe.hincrby(key, f"{endpoint}:throttled_calls", throttled_calls)
+            if responses_429:
+                pipe.hincrby(key, f"{endpoint}:429", responses_429)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not record rate limit metrics: {e}")
+
+    def get_metrics(self):
+        """Cluster-wide counters, e.g. ``{"artists": {"throttled_seconds": 12.5, "429": 3}}``."""
+        metrics = {}
+        raw = self.redis_client.hgetall(f"{self.KEY_PREFIX}:metrics")
+        for field, value in raw.items():
+            endpoint, _, name = field.decode("utf-8").rpartition(":")
+            metrics.setdefault(endpoint, {})[name] = float(value)
+        return metrics
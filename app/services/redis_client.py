@@ -0,0 +1,22 @@
+import os
+import threading
+
+import redis
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis_client():
+    """Process-wide Redis client for code that runs with or without an app context."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                redis_url = os.getenv("REDIS_TLS_URL") or os.getenv("REDIS_URL") or "redis://localhost:6379"
+                if redis_url.startswith("rediss://"):
+                    _client = redis.Redis.from_url(redis_url, ssl_cert_reqs=None)
+                else:
+                    _client = redis.Redis.from_url(redis_url)
+    return _client
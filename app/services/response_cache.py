@@ -0,0 +1,73 @@
+import hashlib
+import json
+import logging
+
+import redis
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth replaying when a cached body is served
+KEPT_HEADERS = ("Content-Type", "ETag", "Cache-Control")
+
+
+def build_response(url, status_code, headers, content):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = "OK" if status_code == 200 else ""
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.encoding = "utf-8"
+    return response
+
+
+def copy_response(response):
+    return build_response(response.url, response.status_code, dict(response.headers), response.content)
+
+
+class ConditionalResponseCache:
+    """ETags and bodies of Spotify GET responses, per user and URL, in Redis.
+
+    Entries are keyed by a hash of the Spotify user ID and full URL, so one
+    user's cached ``/me`` is never served to another, and a user's entries
+    stay warm across token refreshes and new logins.
+    """
+
+    KEY_PREFIX = "spotify:etag"
+
+    def __init__(self, redis_client, ttl):
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def cache_key(url, spotify_user_id):
+        return hashlib.sha256(f"{spotify_user_id}\n{url}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        try:
+            raw = self.redis_client.hmget(f"{self.KEY_PREFIX}:{key}", "etag", "headers", "body")
+        except redis.RedisError as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            return None
+        etag, headers, body = raw
+        if etag is None or body is None:
+            return None
+        return {"etag": etag.decode("utf-8"), "headers": json.loads(headers), "body": body}
+
+    def set(self, key, response):
+        etag = response.headers.get("ETag")
+        if not etag:
+            return
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hset(
+                f"{self.KEY_PREFIX}:{key}",
+                mapping={"etag": etag, "headers": json.dumps(headers), "body": response.content},
+            )
+            pipe.expire(f"{self.KEY_PREFIX}:{key}", self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not store cached response: {e}")
@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+from flask import g, has_request_context
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from .rate_limiter import SpotifyRateLimiter, endpoint_class, parse_retry_after
+from .redis_client import get_redis_client
+from .response_cache import ConditionalResponseCache, build_response, copy_response
+
+logger = logging.getLogger(__name__)
+
+
+class SpotifyClient(requests.Session):
+    """Keep-alive HTTP session shared by every call to the Spotify API.
+
+    Connections to api.spotify.com and accounts.spotify.com are pooled so a
+    playlist build only pays the TCP+TLS handshake once per pooled connection.
+    Any call that does not pass its own ``timeout`` gets the configured default.
+
+    When a ``rate_limiter`` is given every call first takes a token for its
+    endpoint class, and 429 responses are retried after ``Retry-After``
+    instead of being handed back to the caller. Without a limiter the client
+    sleeps out ``Retry-After`` itself, up to ``max_retry_wait`` seconds; a
+    longer ``Retry-After`` raises ``requests.HTTPError`` instead of blocking.
+
+    When a ``response_cache`` is given, authorized GETs that name the
+    ``spotify_user_id`` they are made for are revalidated with
+    ``If-None-Match`` and a 304 is answered from the cached body; entries are
+    per user and URL, so they survive token refreshes. Identical GETs made
+    while handling one Flask request are only sent once.
+    """
+
+    def __init__(self, pool_connections, pool_maxsize, timeout, rate_limiter=None, max_429_retries=3,
+                 response_cache=None, max_retry_wait=30.0):
+        super().__init__()
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_429_retries = max_429_retries
+        self.max_retry_wait = max_retry_wait
+        self.response_cache = response_cache
+        # Block for a free connection instead of opening one the full pool would discard
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, spotify_user_id=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        headers = kwargs.get("headers") or {}
+        if method.upper() != "GET" or "Authorization" not in headers:
+            return self._send(method, url, **kwargs)
+
+        full_url = requests.Request("GET", url, params=kwargs.get("params")).prepare().url
+        memo_key = (headers["Authorization"], full_url)
+        memo = g.setdefault("_spotify_responses", {}) if has_request_context() else None
+        if memo is not None and memo_key in memo:
+            return copy_response(memo[memo_key])
+
+        cache = self.response_cache if spotify_user_id else None
+        key = ConditionalResponseCache.cache_key(full_url, spotify_user_id) if cache is not None else None
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            kwargs["headers"] = {**headers, "If-None-Match": cached["etag"]}
+
+        response = self._send(method, url, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            response = build_response(full_url, 200, cached["headers"], cached["body"])
+        elif response.status_code == 200 and cache is not None:
+            cache.set(key, response)
+
+        if memo is not None and response.status_code == 200:
+            memo[memo_key] = copy_response(response)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        endpoint = endpoint_class(url)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(endpoint)
+            response = super().request(method, url, **kwargs)
+            if response.status_code != 429 or attempt >= self.max_429_retries:
+                return response
+
+            attempt += 1
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if self.rate_limiter is None and retry_after > self.max_retry_wait:
+                logger.warning(
+                    f"Spotify returned 429 for {endpoint} with Retry-After {retry_after:.1f}s, "
+                    f"over the {self.max_retry_wait:.1f}s limit; giving up"
+                )
+                response.raise_for_status()
+            logger.warning(
+                f"Spotify returned 429 for {endpoint}, retrying in {retry_after:.1f}s "
+                f"(attempt {attempt}/{self.max_429_retries})"
+            )
+            if self.rate_limiter is not None:
+                # The cooldown makes the next acquire() wait out Retry-After
+                self.rate_limiter.penalize(endpoint, retry_after)
+            else:
+                time.sleep(retry_after)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_spotify_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                rate_limiter = None
+                if Config.SPOTIFY_RATE_LIMIT_ENABLED:
+                    rate_limiter = SpotifyRateLimiter(
+                        get_redis_client(),
+                        Config.SPOTIFY_RATE_LIMITS,
+                        max_wait=Config.SPOTIFY_RATE_LIMIT_MAX_WAIT,
+                    )
+                response_cache = None
+                if Config.SPOTIFY_RESPONSE_CACHE_ENABLED:
+                    response_cache = ConditionalResponseCache(
+                        get_redis_client(), Config.SPOTIFY_RESPONSE_CACHE_TTL
+                    )
+                _client = SpotifyClient(
+                    pool_connections=Config.SPOTIFY_POOL_CONNECTIONS,
+                    pool_maxsize=Config.SPOTIFY_POOL_MAXSIZE,
+                    timeout=(Config.SPOTIFY_CONNECT_TIMEOUT, Config.SPOTIFY_READ_TIMEOUT),
+                    rate_limiter=rate_limiter,
+                    max_429_retries=Config.SPOTIFY_MAX_429_RETRIES,
+                    response_cache=response_cache,
+                    max_retry_wait=Config.SPOTIFY_RATE_LIMIT_MAX_WAIT,
+                )
+    return _client
+
+
+def _reset_client():
+    # Pooled sockets must not be shared between a gunicorn master and its forks
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_client)
@@ -2,17 +2,48 @@ import base64
 import concurrent.futures
 import logging
 import json
-from collections import defaultdict
 from random import shuffle
 from urllib.parse import quote, urlencode
 
 import requests
-from flask import current_app, session
+from flask import current_app
 
 from config import Config
+from .artist_playlist_cache import ArtistPlaylistCache
+from .audio_features_store import AudioFeaturesStore
+from .batching import get_batch_executor, with_app_context
+from .genre_cache import ArtistGenreCache
+from .genre_matcher import GenreVerdictCache, get_genre_matcher
+from .mood_scoring import MoodRuleSet, MoodScoringEngine
+from .pagination import iter_items, iter_next_pages, iter_offset_pages
+from .redis_client import get_redis_client
+from .spotify_client import get_spotify_client
+from .token_manager import TokenManager
 
 
 class SpotifyService: # pylint: disable=too-few-public-methods
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or get_redis_client()
+        self.genre_cache = ArtistGenreCache(self.redis_client, Config.ARTIST_GENRE_CACHE_TTL)
+        self.audio_features_store = AudioFeaturesStore(
+            self.redis_client, Config.AUDIO_FEATURES_UNAVAILABLE_TTL
+        )
+        self.artist_playlist_cache = ArtistPlaylistCache(
+            self.redis_client, Config.ARTIST_PLAYLIST_CHECK_INTERVAL
+        )
+        self.batch_executor = get_batch_executor()
+        self.genre_verdicts = GenreVerdictCache(get_genre_matcher(), self.redis_client)
+        self.mood_scoring = MoodScoringEngine(MoodRuleSet.from_config(Config.MOOD_RULES))
+        self.token_manager = TokenManager(
+            self.redis_client,
+            lambda refresh_token: self.get_or_refresh_access_token(refresh_token=refresh_token),
+            refresh_margin=Config.SPOTIFY_TOKEN_REFRESH_MARGIN,
+        )
+
+    @property
+    def http(self):
+        return get_spotify_client()
+
     def get_or_refresh_access_token(self, code=None, refresh_token=None):
         token_url = Config.SPOTIFY_TOKEN_URL
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
@@ -37,7 +68,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
             raise ValueError("Either code or refresh_token must be provided.")
 
         try:
-            response = requests.post(token_url, data=payload, headers=headers)
+            response = self.http.post(token_url, data=payload, headers=headers)
             response.raise_for_status()
             response_data = response.json()
             current_app.logger.info("Access token retrieved successfully")
@@ -48,41 +79,8 @@ class SpotifyService: # pylint: disable=too-few-public-methods
                 current_app.logger.error(f"Response content: {response.text}")
             return None
 
-    def get_current_user(self, access_token):
-        endpoint = "https://api.spotify.com/v1/me"
-        headers = {"Authorization": f"Bearer {access_token}"}
-
-        try:
-            response = requests.get(endpoint, headers=headers)
-
-            if (
-                response.status_code == 401
-            ):  # Unauthorized, possibly due to expired token
-                refresh_token = session.get("refresh_token")
-                if refresh_token:
-                    new_tokens = self.get_or_refresh_access_token(
-                        refresh_token=refresh_token
-                    )
-                    if new_tokens:
-                        session["access_token"] = new_tokens["access_token"]
-                        session["refresh_token"] = new_tokens["refresh_token"]
-                        headers["Authorization"] = (
-                            f'Bearer {new_tokens["access_token"]}'
-                        )
-                        response = requests.get(endpoint, headers=headers)
-                    else:
-                        current_app.logger.error("Failed to refresh access token.")
-                        return None
-                else:
-                    current_app.logger.error("Refresh token not available.")
-                    return None
-
-            response.raise_for_status()
-            return response.json()
-
-        except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Failed to fetch user data: {e}")
-            return None
+    def get_access_token(self, user_id):
+        return self.token_manager.get_access_token(user_id)
 
     def create_playlist(self, user_id, playlist_name, description, access_token):
         # Validate and sanitize playlist_name and description
@@ -104,7 +102,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
         }
 
         try:
-            response = requests.post(endpoint, headers=headers, json=payload)
+            response = self.http.post(endpoint, headers=headers, json=payload)
             response.raise_for_status()
             return response.json()["id"]
         except requests.exceptions.RequestException as e:
@@ -112,63 +110,109 @@ class SpotifyService: # pylint: disable=too-few-public-methods
             return None
 
     def get_artist_playlist_tracks(self, playlist_id, access_token, existing_tracks):
-        track_uris = []
-        endpoint = f"{Config.SPOTIFY_API_BASE_URL}playlists/{playlist_id}/tracks"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        params = {"fields": "items(track(uri,artists))", "limit": 100}
+        try:
+            playlist_tracks = self.artist_playlist_cache.get_tracks(playlist_id, access_token)
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(
+                f"Failed to retrieve artist playlist tracks: {e}"
+            )
+            return []
 
-        while True:
-            try:
-                response = requests.get(endpoint, headers=headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-                for item in data["items"]:
-                    track_uri = item["track"]["uri"]
-                    if track_uri not in existing_tracks and all(
-                        artist["id"] != "2lZ09YCpdWMMmBTSdDqspr"
-                        for artist in item["track"]["artists"]
-                    ):
-                        track_uris.append(track_uri)
-                if "next" in data:
-                    endpoint = data["next"]
-                else:
-                    break
-            except requests.exceptions.RequestException as e:
-                current_app.logger.error(
-                    f"Failed to retrieve artist playlist tracks: {e}"
-                )
-                break
+        existing_tracks = set(existing_tracks)
+        track_uris = [
+            track["uri"]
+            for track in playlist_tracks
+            if track["uri"] not in existing_tracks
+            and "2lZ09YCpdWMMmBTSdDqspr" not in track["artist_ids"]
+        ]
 
         # current_app.logger.debug(f"Track URIs before shuffling: {track_uris}")
         shuffle(track_uris)  # Shuffle the entire list of track URIs
         # current_app.logger.debug(f"Track URIs after shuffling: {track_uris}")
         return track_uris[:20]  # Return the first 20 tracks after shuffling
 
-    def get_mood_defined_tracks(self, access_token):
-        params = {"limit": 50, "offset": 0, "time_range": "long_term"}
+    def _fetch_top_tracks(self, access_token, user_id=None):
+        """Return ``(tracks, complete)``; ``complete`` is False if a page failed and the list is partial."""
+        endpoint = f"{Config.SPOTIFY_API_BASE_URL}me/top/tracks"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        params = {"limit": 50, "time_range": "long_term"}
         all_tracks = []
-        for _ in range(4):  # Make four calls to gather 200 songs
-            endpoint = f"{Config.SPOTIFY_API_BASE_URL}me/top/tracks"
-            headers = {"Authorization": f"Bearer {access_token}"}
-            try:
-                response = requests.get(endpoint, headers=headers, params=params)
-                response.raise_for_status()
-                data = response.json()
+        complete = True
+        try:
+            # The four offsets are known up front, so gather 200 songs in one round trip
+            pages = iter_offset_pages(endpoint, headers, range(0, 200, 50), params, spotify_user_id=user_id)
+            for batch, data in enumerate(pages, start=1):
                 all_tracks.extend(data["items"])
-                params["offset"] += 50
-                current_app.logger.debug(f"Retrieved {len(data['items'])} tracks in batch {_ + 1}")
-            except requests.exceptions.RequestException as e:
-                current_app.logger.error(f"Failed to retrieve mood-defined tracks: {e}")
-                break
+                current_app.logger.debug(f"Retrieved {len(data['items'])} tracks in batch {batch}")
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(f"Failed to retrieve mood-defined tracks: {e}")
+            complete = False
+        return all_tracks, complete
+
+    def _prefetch_key(self, user_id):
+        return f"prefetch:top_tracks:{user_id}"
+
+    def prefetch_candidate_pool(self, user_id):
+        """Warm everything a build needs for ``user_id`` while the user is being redirected.
+
+        ``user_id`` is the Spotify user ID the tokens are stored under. The
+        top tracks go into a short-lived per-user key, unless a page failed:
+        a partial pool is not cached, so the build fetches the full one
+        itself. Their audio features and artist genres land in the shared
+        stores the build reads. Failures are only logged.
+        """
+        try:
+            self._prefetch_candidate_pool(user_id)
+        except Exception as e:  # pylint: disable=broad-except
+            current_app.logger.warning(f"Prefetch for user {user_id} failed: {e}")
+
+    def _prefetch_candidate_pool(self, user_id):
+        if not self.redis_client.set(f"{self._prefetch_key(user_id)}:lock", 1, nx=True, ex=60):
+            return
+        access_token = self.get_access_token(user_id)
+        if not access_token:
+            return
+
+        top_tracks, complete = self._fetch_top_tracks(access_token, user_id)
+        tracks = [
+            {
+                "id": track["id"],
+                "uri": track["uri"],
+                "popularity": track["popularity"],
+                "artists": [{"id": artist["id"]} for artist in track["artists"]],
+            }
+            for track in top_tracks
+        ]
+        if not tracks:
+            return
+        if complete:
+            self.redis_client.set(self._prefetch_key(user_id), json.dumps(tracks), ex=Config.PREFETCH_TTL)
+
+        self.get_audio_features([track["id"] for track in tracks], access_token)
+        self.get_genres_for_artists(
+            [artist["id"] for track in tracks for artist in track["artists"]], access_token
+        )
+        current_app.logger.info(f"Prefetched candidate pool of {len(tracks)} tracks for user {user_id}")
+
+    def get_mood_defined_tracks(self, access_token, on_stage=None, user_id=None):
+        cached = self.redis_client.get(self._prefetch_key(user_id)) if user_id else None
+        if cached is not None:
+            all_tracks = json.loads(cached)
+            current_app.logger.debug(f"Using prefetched top tracks for user {user_id}")
+        else:
+            all_tracks, _ = self._fetch_top_tracks(access_token, user_id)
 
         current_app.logger.info(f"Retrieved total of {len(all_tracks)} tracks before filtering")
+        if on_stage:
+            on_stage("tracks_fetched")
 
         # Filter tracks
-        excluded_genres = set(Config.EXCLUDED_GENRES)
         excluded_artists = {"2lZ09YCpdWMMmBTSdDqspr"}  # Add artist URIs to exclude here
-        filtered_tracks = self.filter_tracks(all_tracks, access_token, excluded_genres, excluded_artists)
+        filtered_tracks = self.filter_tracks(all_tracks, access_token, excluded_artists)
 
         current_app.logger.info(f"Filtered down to {len(filtered_tracks)} tracks")
+        if on_stage:
+            on_stage("filtered")
 
         # Sort the filtered tracks by popularity in descending order
         sorted_filtered_tracks = sorted(filtered_tracks, key=lambda track: track['popularity'], reverse=True)
@@ -178,50 +222,77 @@ class SpotifyService: # pylint: disable=too-few-public-methods
 
         return track_uris
 
+    def _fetch_audio_features_batch(self, batch, headers):
+        response = self.http.get(f'{Config.SPOTIFY_API_BASE_URL}audio-features', headers=headers, params={'ids': ','.join(batch)})
+        response.raise_for_status()
+        batch_features = response.json().get('audio_features', [])
+        # Spotify answers null for tracks it has no features for
+        return dict(zip(batch, batch_features))
+
     def get_audio_features(self, track_ids, access_token):
         headers = {'Authorization': f'Bearer {access_token}'}
-        audio_features = []
-
-        for i in range(0, len(track_ids), 50):
-            batch = track_ids[i:i+50]
-            response = requests.get('https://api.spotify.com/v1/audio-features', headers=headers, params={'ids': ','.join(batch)})
-            if response.status_code == 200:
-                batch_features = response.json().get('audio_features', [])
-                audio_features.extend(batch_features)
-                current_app.logger.debug(f"Successfully fetched audio features for batch {i//50 + 1}")
-            else:
-                current_app.logger.error(f"Error fetching audio features for batch {i//50 + 1}: {response.status_code}")
-                current_app.logger.error(f"Response content: {response.text}")
-                continue
+        unique_ids = list(dict.fromkeys(track_ids))
+        features_by_track, missing_ids = self.audio_features_store.get_many(unique_ids)
+
+        results = self.batch_executor.run(
+            lambda batch: self._fetch_audio_features_batch(batch, headers), missing_ids
+        )
+        fetched = {track_id: feature for track_id, feature in results.items() if feature is not None}
+        unavailable = [track_id for track_id, feature in results.items() if feature is None]
+
+        self.audio_features_store.set_many(fetched, unavailable)
+        features_by_track.update(fetched)
+        audio_features = [features_by_track[track_id] for track_id in unique_ids if track_id in features_by_track]
+
         if not audio_features:
             current_app.logger.error(f"No audio features retrieved for any tracks. Total tracks: {len(track_ids)}")
         else:
-            current_app.logger.info(f"Retrieved audio features for {len(audio_features)} out of {len(track_ids)} tracks")
+            current_app.logger.info(
+                f"Retrieved audio features for {len(audio_features)} out of {len(unique_ids)} tracks "
+                f"({len(unique_ids) - len(missing_ids)} from store, {len(fetched)} from Spotify)"
+            )
             current_app.logger.debug(f"First few audio features: {audio_features[:5]}")
 
         return audio_features
 
+    def _fetch_genres_batch(self, batch, headers):
+        response = self.http.get(f'{Config.SPOTIFY_API_BASE_URL}artists', headers=headers, params={'ids': ','.join(batch)})
+        response.raise_for_status()
+        # Spotify answers null in the place of an unknown artist; cache it as genre-less
+        # rather than asking for it again on every build
+        return {
+            artist_id: (artist or {}).get('genres', [])
+            for artist_id, artist in zip(batch, response.json().get('artists', []))
+        }
+
     def get_genres_for_artists(self, artist_ids, access_token):
         headers = {'Authorization': f'Bearer {access_token}'}
-        genres_dict = {}
-
-        for i in range(0, len(artist_ids), 50):
-            batch = artist_ids[i:i+50]
-            response = requests.get(f'https://api.spotify.com/v1/artists?ids={",".join(batch)}', headers=headers)
-            if response.status_code == 200:
-                response_data = response.json().get('artists', [])
-                for artist in response_data:
-                    genres_dict[artist['id']] = artist.get('genres', [])
-            else:
-                current_app.logger.error(f"Error fetching genres for batch {i//50 + 1}: {response.status_code}")
-                continue
+        unique_ids = list(dict.fromkeys(artist_ids))
+        genres_dict, missing_ids = self.genre_cache.get_many(unique_ids)
+
+        fetched = self.batch_executor.run(
+            lambda batch: self._fetch_genres_batch(batch, headers), missing_ids
+        )
 
+        self.genre_cache.set_many(fetched)
+        genres_dict.update(fetched)
+        current_app.logger.debug(
+            f"Artist genres: {len(unique_ids) - len(missing_ids)} cached, "
+            f"{len(missing_ids)} fetched from {len(artist_ids)} artist IDs"
+        )
         return genres_dict
 
-    def filter_tracks(self, tracks, access_token, excluded_genres, excluded_artists):
+    def filter_tracks(self, tracks, access_token, excluded_artists):
         track_ids = [track['id'] for track in tracks]
         artist_ids = [artist['id'] for track in tracks for artist in track['artists']]
-        audio_features = self.get_audio_features(track_ids, access_token)
+
+        # The two phases are independent, so their batches share the pool at the same time
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as phase_executor:
+            genres_future = phase_executor.submit(
+                with_app_context(self.get_genres_for_artists), artist_ids, access_token
+            )
+            audio_features = self.get_audio_features(track_ids, access_token)
+            genres_dict = genres_future.result()
 
         current_app.logger.debug(f"Tracks count: {len(tracks)}, Audio features count: {len(audio_features)}")
 
@@ -237,52 +308,20 @@ class SpotifyService: # pylint: disable=too-few-public-methods
             current_app.logger.error(f"Audio features data: {audio_features}")
             return []  # Return an empty list if we can't process the audio features
 
-        genres_dict = self.get_genres_for_artists(artist_ids, access_token)
-        audio_features_dict = {feature['id']: feature for feature in audio_features}
-
-        filtered_tracks = []
-        artist_count = defaultdict(int)
-        max_tracks_per_artist = 4
-        max_valence = 0.3
-        max_energy = 0.5
-        min_popularity = 20  # Minimum popularity threshold
-
-        for track in tracks:
-            artist_id = track['artists'][0]['id']
-            genres = [genre for artist in track['artists'] for genre in genres_dict.get(artist['id'], [])]
-
-            # Check for exclusions and allowed conditions
-            if any(artist['id'] in excluded_artists for artist in track['artists']):
-                continue
-            elif any(genre in excluded_genres for genre in genres):
-                continue
-            elif artist_count[artist_id] >= max_tracks_per_artist:
-                continue
-            elif track['popularity'] < min_popularity:  # Filter out tracks with popularity less than 20
-                continue
-            else:
-                valence = audio_features_dict.get(track['id'], {}).get('valence', 0)
-                energy = audio_features_dict.get(track['id'], {}).get('energy', 0)
-                if (
-                    (energy < 0.5 and 0.3 <= valence <= 0.4) or
-                    (valence < 0.3 and 0.5 <= energy <= 0.6)
-                ):
-                    filtered_tracks.append({
-                        'uri': track['uri'],
-                        'popularity': track['popularity']
-                    })
-                    artist_count[artist_id] += 1
-                elif valence <= max_valence and energy <= max_energy:
-                    filtered_tracks.append({
-                        'uri': track['uri'],
-                        'popularity': track['popularity']
-                    })
-                    artist_count[artist_id] += 1
-
-        return filtered_tracks
-
-    def build_and_shuffle_playlist(self, playlist_id, artist_playlist_id, access_token):
-        mood_tracks = self.get_mood_defined_tracks(access_token)
+        # Each distinct genre is judged once, however many artists and tracks carry it
+        excluded_genres = self.genre_verdicts.resolve(
+            genre for genres in genres_dict.values() for genre in genres
+        )
+        return self.mood_scoring.filter_tracks(
+            tracks,
+            audio_features_dict,
+            genres_dict,
+            is_excluded_genre=excluded_genres.__getitem__,
+            excluded_artists=excluded_artists,
+        )
+
+    def build_and_shuffle_playlist(self, playlist_id, artist_playlist_id, access_token, on_stage=None, user_id=None):
+        mood_tracks = self.get_mood_defined_tracks(access_token, on_stage=on_stage, user_id=user_id)
         specified_uris = Config.SPECIFIED_TRACK_URIS
         artist_tracks = self.get_artist_playlist_tracks(
             artist_playlist_id, access_token, mood_tracks + specified_uris
@@ -327,23 +366,55 @@ class SpotifyService: # pylint: disable=too-few-public-methods
 
         return [track for track in final_tracks if track is not None]
 
-    def add_tracks_to_playlist(self, playlist_id, tracks, access_token):
+    def get_playlist_tracks(self, playlist_id, access_token):
+        endpoint = f"{Config.SPOTIFY_API_BASE_URL}playlists/{playlist_id}/tracks"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        params = {"fields": "next,items(track(uri))", "limit": 100}
+        pages = iter_next_pages(endpoint, headers, params)
+        return [item["track"]["uri"] for item in iter_items(pages) if item.get("track")]
+
+    def _write_track_chunk(self, method, endpoint, headers, chunk):
+        response = self.http.request(method, endpoint, headers=headers, json={"uris": chunk})
+        response.raise_for_status()
+
+    def add_tracks_to_playlist(self, playlist_id, tracks, access_token, replace=False, parallel=False):
+        """Write ``tracks`` in chunks of 100 URIs (Spotify's per-call limit).
+
+        ``replace`` makes the first chunk a "replace items" PUT, so writing a
+        fresh playlist is idempotent and costs one call per 100 tracks.
+        ``parallel`` sends the appended chunks concurrently, giving up their
+        relative order; leave it off when track positions matter.
+        """
         # Validate and sanitize playlist_id and tracks
         if not playlist_id or not isinstance(playlist_id, str):
             raise ValueError("Invalid playlist ID")
         if not tracks or not isinstance(tracks, list):
             raise ValueError("Invalid tracks")
-        endpoint = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
+        endpoint = f"{Config.SPOTIFY_API_BASE_URL}playlists/{playlist_id}/tracks"
         headers = {"Authorization": f"Bearer {access_token}"}
-        payload = {"uris": tracks}
+        chunks = [tracks[i:i + 100] for i in range(0, len(tracks), 100)]
 
         try:
-            response = requests.post(endpoint, headers=headers, json=payload)
-            response.raise_for_status()
+            if replace:
+                self._write_track_chunk("PUT", endpoint, headers, chunks.pop(0))
+            if parallel and len(chunks) > 1:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(chunks), 4)) as executor:
+                    futures = [
+                        executor.submit(self._write_track_chunk, "POST", endpoint, headers, chunk)
+                        for chunk in chunks
+                    ]
+                    for future in futures:
+                        future.result()
+            else:
+                for chunk in chunks:
+                    self._write_track_chunk("POST", endpoint, headers, chunk)
             current_app.logger.info("Tracks added to the playlist successfully.")
+            return True
         except requests.exceptions.RequestException as e:
             current_app.logger.error(f"Failed to add tracks to the playlist: {e}")
-            current_app.logger.error(f"Response text: {response.text}")
+            if e.response is not None:
+                current_app.logger.error(f"Response text: {e.response.text}")
+            return False
 
     def exchange_code_for_token(self, code):
         payload = {
@@ -353,7 +424,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
             "client_id": Config.CLIENT_ID,
             "client_secret": Config.CLIENT_SECRET,
         }
-        response = requests.post(Config.SPOTIFY_TOKEN_URL, data=payload)
+        response = self.http.post(Config.SPOTIFY_TOKEN_URL, data=payload)
         response.raise_for_status()
         return response.json()
 
@@ -364,7 +435,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
         headers = {"Authorization": f"Bearer {access_token}"}
 
         try:
-            response = requests.put(endpoint, headers=headers)
+            response = self.http.put(endpoint, headers=headers)
             response.raise_for_status()
             current_app.logger.info("Artist followed successfully.")
         except requests.exceptions.RequestException as e:
@@ -382,7 +453,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
             "show_dialog": "true"
         }
         
-        web_auth_url = f"https://accounts.spotify.com/authorize?{urlencode(params)}"
+        web_auth_url = f"{Config.AUTH_URL}?{urlencode(params)}"
         android_auth_url = f"intent://accounts.spotify.com/authorize?{urlencode(params)}#Intent;package=com.spotify.music;scheme=https;end"
         ios_auth_url = f"spotify-action://authorize?{urlencode(params)}"
         
@@ -399,7 +470,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
         if not image_data:
             raise ValueError("Invalid image data")
 
-        endpoint = f"https://api.spotify.com/v1/playlists/{playlist_id}/images"
+        endpoint = f"{Config.SPOTIFY_API_BASE_URL}playlists/{playlist_id}/images"
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "image/jpeg",
@@ -412,7 +483,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
     def _make_upload_request(self, endpoint, headers, data, retries=5):
         for attempt in range(retries):
             try:
-                response = requests.put(
+                response = self.http.put(
                     endpoint, headers=headers, data=data, timeout=30
                 )
                 response.raise_for_status()
@@ -472,7 +543,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
         endpoint = f"{Config.SPOTIFY_API_BASE_URL}me/top/{item_type}"
         params = {"limit": 20, "time_range": time_range}
         try:
-            response = requests.get(endpoint, headers=headers, params=params)
+            response = self.http.get(endpoint, headers=headers, params=params)
             response.raise_for_status()
             return response.json()["items"]
         except requests.exceptions.RequestException as e:
@@ -485,7 +556,7 @@ class SpotifyService: # pylint: disable=too-few-public-methods
         headers = {"Authorization": f"Bearer {access_token}"}
         endpoint = f"{Config.SPOTIFY_API_BASE_URL}me"
         try:
-            response = requests.get(endpoint, headers=headers)
+            response = self.http.get(endpoint, headers=headers)
             response.raise_for_status()
             data = response.json()
             current_app.logger.info(f"Successfully retrieved user profile: {data}")
@@ -507,12 +578,12 @@ class SpotifyService: # pylint: disable=too-few-public-methods
             raise ValueError(f"Failed to retrieve user profile data: {e}")
 
     def revoke_token(self, access_token):
-        endpoint = "https://accounts.spotify.com/api/token"
+        endpoint = Config.SPOTIFY_TOKEN_URL
         headers = {"Authorization": f"Bearer {access_token}"}
         payload = {"token": access_token}
 
         try:
-            response = requests.post(endpoint, headers=headers, data=payload, timeout=30)
+            response = self.http.post(endpoint, headers=headers, data=payload, timeout=30)
             response.raise_for_status()
             current_app.logger.info("Access token revoked successfully.")
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,84 @@
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+Stage = namedtuple("Stage", "name fn depends_on timeout required")
+
+
+class StageError(Exception):
+    def __init__(self, stage, message):
+        super().__init__(f"Stage {stage} {message}")
+        self.stage = stage
+
+
+class StageGraph:
+    """Runs a small DAG of pipeline stages, each as soon as its dependencies finish.
+
+    A stage's function is called with its dependencies' results, in the order
+    they are listed in ``depends_on``. Stages that overrun their ``timeout``
+    are abandoned and count as failed; stages depending on a failed stage are
+    skipped. ``run`` raises ``StageError`` if a required stage failed, while
+    failures of optional stages are only logged and left in ``errors``.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.results = {}
+        self.errors = {}
+
+    def add(self, name, fn, depends_on=(), timeout=None, required=True):
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self.stages[name] = Stage(name, fn, tuple(depends_on), timeout, required)
+
+    def _start_ready(self, executor, pending, running):
+        for name, stage in list(pending.items()):
+            if any(dependency in self.errors for dependency in stage.depends_on):
+                self.errors[name] = StageError(name, "skipped after a dependency failed")
+                del pending[name]
+            elif all(dependency in self.results for dependency in stage.depends_on):
+                deadline = time.monotonic() + stage.timeout if stage.timeout else None
+                args = [self.results[dependency] for dependency in stage.depends_on]
+                running[executor.submit(stage.fn, *args)] = (stage, deadline)
+                del pending[name]
+
+    def run(self):
+        pending = dict(self.stages)
+        running = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        try:
+            self._start_ready(executor, pending, running)
+            while running:
+                deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+                wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, _ = running.pop(future)
+                    try:
+                        self.results[stage.name] = future.result()
+                    except Exception as e:  # pylint: disable=broad-except
+                        self.errors[stage.name] = e
+
+                now = time.monotonic()
+                for future, (stage, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        # The thread cannot be killed; its result is simply ignored
+                        running.pop(future)
+                        future.cancel()
+                        self.errors[stage.name] = StageError(stage.name, f"timed out after {stage.timeout}s")
+
+                self._start_ready(executor, pending, running)
+        finally:
+            executor.shutdown(wait=False)
+
+        for name, error in self.errors.items():
+            if self.stages[name].required:
+                raise StageError(name, f"failed: {error}") from error
+            logger.warning(f"Optional stage {name} failed: {error}")
+        return self.results
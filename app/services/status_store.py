@@ -0,0 +1,61 @@
+# Move KEYS[1] to ARGV[2] only if its current code (or "-" when absent) is one of ARGV[1]
+TRANSITION_SCRIPT = """
+local current = redis.call('GET', KEYS[1]) or '-'
+if string.find(ARGV[1], current, 1, true) == nil then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+# One byte per status keeps the store small however many playlists are built
+STATE_CODES = {"queued": "q", "running": "r", "done": "d", "failed": "f"}
+CODE_STATES = {code: state for state, code in STATE_CODES.items()}
+
+# State -> codes it may be entered from ("-" means no status yet)
+TRANSITIONS = {
+    "queued": "-f",
+    "running": "q",
+    "done": "r",
+    "failed": "qr",
+}
+
+
+class StatusStore:
+    """Job statuses shared by every worker, one short-lived Redis key per job.
+
+    Transitions are checked and applied atomically in Redis, so two workers
+    can never both move the same job out of ``queued``. Every key carries a
+    TTL, which keeps memory bounded no matter how many jobs are created.
+    """
+
+    def __init__(self, redis_client, namespace, ttl=24 * 3600):
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self._transition = redis_client.register_script(TRANSITION_SCRIPT)
+
+    def key(self, job_id):
+        return f"status:{self.namespace}:{job_id}"
+
+    def transition(self, job_id, state):
+        """Move ``job_id`` to ``state``; returns False if its current status doesn't allow it."""
+        moved = self._transition(
+            keys=[self.key(job_id)], args=[TRANSITIONS[state], STATE_CODES[state], self.ttl]
+        )
+        return bool(moved)
+
+    def get(self, job_id):
+        code = self.redis_client.get(self.key(job_id))
+        return CODE_STATES[code.decode("utf-8")] if code else None
+
+    def get_many(self, job_ids):
+        """Bulk lookup for admin views: ``{job_id: state or None}`` in one MGET."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        codes = self.redis_client.mget([self.key(job_id) for job_id in job_ids])
+        return {
+            job_id: CODE_STATES[code.decode("utf-8")] if code else None
+            for job_id, code in zip(job_ids, codes)
+        }
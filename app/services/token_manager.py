@@ -0,0 +1,127 @@
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Only the holder of the lock may release it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class TokenManager:
+    """Single home for a user's Spotify tokens, kept in a Redis hash.
+
+    ``user_id`` is always the Spotify user ID, never a name typed by the
+    visitor, so two people can't end up sharing (or overwriting) tokens.
+
+    ``get_access_token`` hands out the stored token until it is within
+    ``refresh_margin`` seconds of expiring, then renews it before it is used.
+    Renewal is single-flight across workers: the first caller takes a Redis
+    lock and refreshes, concurrent callers for the same user wait for the
+    new token instead of refreshing it again.
+
+    ``refresh_tokens`` is called with a refresh token and must return
+    Spotify's token response (or ``None`` on failure).
+    """
+
+    KEY_PREFIX = "spotify:token"
+
+    def __init__(self, redis_client, refresh_tokens, refresh_margin=300, lock_timeout=10, ttl=30 * 24 * 3600):
+        self.redis_client = redis_client
+        self.refresh_tokens = refresh_tokens
+        self.refresh_margin = refresh_margin
+        self.lock_timeout = lock_timeout
+        self.ttl = ttl
+        self._release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+    def _key(self, user_id):
+        return f"{self.KEY_PREFIX}:{user_id}"
+
+    def store(self, user_id, token_data):
+        """Save Spotify's token response for ``user_id``.
+
+        Refresh responses usually omit ``refresh_token``; the stored one is kept then.
+        """
+        mapping = {
+            "access_token": token_data["access_token"],
+            "expires_at": int(time.time()) + int(token_data.get("expires_in", 3600)),
+        }
+        if token_data.get("refresh_token"):
+            mapping["refresh_token"] = token_data["refresh_token"]
+        pipe = self.redis_client.pipeline()
+        pipe.hset(self._key(user_id), mapping=mapping)
+        pipe.expire(self._key(user_id), self.ttl)
+        pipe.execute()
+
+    def get_tokens(self, user_id):
+        if not user_id:
+            return None
+        raw = self.redis_client.hgetall(self._key(user_id))
+        if not raw:
+            return None
+        tokens = {field.decode("utf-8"): value.decode("utf-8") for field, value in raw.items()}
+        tokens["expires_at"] = int(tokens.get("expires_at", 0))
+        return tokens
+
+    def get_refresh_token(self, user_id):
+        tokens = self.get_tokens(user_id)
+        return tokens.get("refresh_token") if tokens else None
+
+    def get_access_token(self, user_id):
+        tokens = self.get_tokens(user_id)
+        if tokens is None:
+            return None
+        if tokens["expires_at"] - time.time() > self.refresh_margin:
+            return tokens["access_token"]
+        return self.refresh(user_id, stale_token=tokens["access_token"])
+
+    def refresh(self, user_id, stale_token=None):
+        """Renew the user's access token once, however many callers ask at the same time.
+
+        ``stale_token`` is the token the caller found unusable; if another
+        worker already replaced it, the new token is returned without a refresh.
+        """
+        lock_key = f"{self._key(user_id)}:lock"
+        lock_id = str(uuid.uuid4())
+        deadline = time.time() + self.lock_timeout
+
+        while True:
+            if self.redis_client.set(lock_key, lock_id, nx=True, px=self.lock_timeout * 1000):
+                try:
+                    return self._refresh_locked(user_id, stale_token)
+                finally:
+                    self._release_lock(keys=[lock_key], args=[lock_id])
+
+            time.sleep(0.1)
+            tokens = self.get_tokens(user_id)
+            if tokens and tokens["access_token"] != stale_token:
+                return tokens["access_token"]
+            if time.time() >= deadline:
+                logger.warning(f"Timed out waiting for token refresh of user {user_id}")
+                return tokens["access_token"] if tokens else None
+
+    def _refresh_locked(self, user_id, stale_token):
+        tokens = self.get_tokens(user_id)
+        if tokens is None:
+            return None
+        if stale_token is not None and tokens["access_token"] != stale_token:
+            return tokens["access_token"]
+        if not tokens.get("refresh_token"):
+            logger.error(f"Refresh token not available for user {user_id}")
+            return None
+
+        token_data = self.refresh_tokens(tokens["refresh_token"])
+        if not token_data:
+            logger.error(f"Failed to refresh access token for user {user_id}")
+            return None
+        self.store(user_id, token_data)
+        logger.info(f"Refreshed access token for user {user_id}")
+        return token_data["access_token"]
+
+    def invalidate(self, user_id):
+        self.redis_client.delete(self._key(user_id))
@@ -1,6 +1,9 @@
 import requests
 from flask import current_app
 
+from config import Config
+
+from ..services.spotify_client import get_spotify_client
 from ..services.spotify_service import SpotifyService
 
 
@@ -8,12 +11,12 @@ class UserService: # pylint: disable=too-few-public-methods
     def __init__(self):
         self.spotify_api = SpotifyService()
 
-    def get_user_details(self, access_token):
-        endpoint = "https://api.spotify.com/v1/me"
+    def get_user_details(self, access_token, spotify_user_id=None):
+        endpoint = f"{Config.SPOTIFY_API_BASE_URL}me"
         headers = {"Authorization": f"Bearer {access_token}"}
 
         try:
-            response = requests.get(endpoint, headers=headers, timeout=5)
+            response = get_spotify_client().get(endpoint, headers=headers, timeout=5, spotify_user_id=spotify_user_id)
             response.raise_for_status()
             user_data = response.json()
             if "id" not in user_data:
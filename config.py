@@ -2,15 +2,30 @@ import os
 import redis
 
 from datetime import timedelta
-from typing import List
+from typing import Dict, List, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def database_pool_options(bind, pool_size=5, max_overflow=10):
+    """Engine pool options for one database bind, overridable per bind from the environment."""
+    prefix = f"DB_{bind.upper()}_"
+    return {
+        "pool_size": int(os.getenv(f"{prefix}POOL_SIZE", pool_size)),
+        "max_overflow": int(os.getenv(f"{prefix}MAX_OVERFLOW", max_overflow)),
+        "pool_pre_ping": os.getenv(f"{prefix}POOL_PRE_PING", "true").lower() == "true",
+        "pool_recycle": int(os.getenv(f"{prefix}POOL_RECYCLE", 1800)),
+    }
+
+
 class Config:
     # Secret key for session management
     SECRET_KEY: str = os.getenv("SECRET_KEY")
 
+    # Bearer token for the /admin endpoints (unset disables them)
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN")
+
     # Spotify API credentials
     CLIENT_ID: str = os.getenv("CLIENT_ID")
     CLIENT_SECRET: str = os.getenv("CLIENT_SECRET")
@@ -24,10 +39,86 @@ class Config:
     SESSION_REDIS = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
     PERMANENT_SESSION_LIFETIME: timedelta = timedelta(minutes=30)
 
-    # Spotify API endpoints
-    AUTH_URL: str = "https://accounts.spotify.com/authorize"
-    SPOTIFY_TOKEN_URL: str = "https://accounts.spotify.com/api/token"
-    SPOTIFY_API_BASE_URL: str = "https://api.spotify.com/v1/"
+    # Spotify API endpoints (point both base URLs at spotify_stub for offline load tests)
+    SPOTIFY_ACCOUNTS_BASE_URL: str = os.getenv("SPOTIFY_ACCOUNTS_BASE_URL", "https://accounts.spotify.com/")
+    SPOTIFY_API_BASE_URL: str = os.getenv("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1/")
+    AUTH_URL: str = f"{SPOTIFY_ACCOUNTS_BASE_URL}authorize"
+    SPOTIFY_TOKEN_URL: str = f"{SPOTIFY_ACCOUNTS_BASE_URL}api/token"
+
+    # Shared Spotify HTTP client (hosts pooled, default timeouts in seconds; the pool
+    # size per host, SPOTIFY_POOL_MAXSIZE, follows the thread counts further down)
+    SPOTIFY_POOL_CONNECTIONS: int = int(os.getenv("SPOTIFY_POOL_CONNECTIONS", 4))
+    SPOTIFY_CONNECT_TIMEOUT: float = float(os.getenv("SPOTIFY_CONNECT_TIMEOUT", 3.05))
+    SPOTIFY_READ_TIMEOUT: float = float(os.getenv("SPOTIFY_READ_TIMEOUT", 15))
+
+    # Cluster-wide Spotify rate limiting: endpoint class -> (requests per second, burst)
+    SPOTIFY_RATE_LIMIT_ENABLED: bool = os.getenv("SPOTIFY_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    SPOTIFY_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+        "default": (10, 20),
+        "audio-features": (3, 6),
+        "artists": (3, 6),
+        "me/top": (5, 10),
+        "accounts": (5, 10),
+    }
+    SPOTIFY_RATE_LIMIT_MAX_WAIT: float = float(os.getenv("SPOTIFY_RATE_LIMIT_MAX_WAIT", 30))
+    SPOTIFY_MAX_429_RETRIES: int = int(os.getenv("SPOTIFY_MAX_429_RETRIES", 3))
+
+    # ETag cache for Spotify GETs, per user and URL (seconds)
+    SPOTIFY_RESPONSE_CACHE_ENABLED: bool = os.getenv("SPOTIFY_RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    SPOTIFY_RESPONSE_CACHE_TTL: int = int(os.getenv("SPOTIFY_RESPONSE_CACHE_TTL", 900))
+
+    # Shared artist genre cache lifetime in seconds
+    ARTIST_GENRE_CACHE_TTL: int = int(os.getenv("ARTIST_GENRE_CACHE_TTL", 7 * 24 * 3600))
+
+    # Audio features are stored without expiry; tracks Spotify has none for are retried after this many seconds
+    AUDIO_FEATURES_UNAVAILABLE_TTL: int = int(os.getenv("AUDIO_FEATURES_UNAVAILABLE_TTL", 24 * 3600))
+
+    # How often (seconds) the curated artist playlist's snapshot_id is re-checked
+    ARTIST_PLAYLIST_CHECK_INTERVAL: int = int(os.getenv("ARTIST_PLAYLIST_CHECK_INTERVAL", 600))
+
+    # Concurrent 50-ID batches (audio features, artist genres) per process, and retries per batch
+    SPOTIFY_BATCH_CONCURRENCY: int = int(os.getenv("SPOTIFY_BATCH_CONCURRENCY", 8))
+    SPOTIFY_BATCH_RETRIES: int = int(os.getenv("SPOTIFY_BATCH_RETRIES", 2))
+
+    # Longest a build progress stream stays open (seconds). Each open stream holds one
+    # gunicorn thread (see Procfile), so size WEB_THREADS for concurrent loading pages.
+    BUILD_PROGRESS_STREAM_TIMEOUT: int = int(os.getenv("BUILD_PROGRESS_STREAM_TIMEOUT", 120))
+
+    # Seconds a worker may hold a job before it is presumed dead and the job is requeued
+    # (must exceed the longest build), and how many times in all the worker runs a failing build
+    JOB_VISIBILITY_TIMEOUT: int = int(os.getenv("JOB_VISIBILITY_TIMEOUT", 600))
+    PLAYLIST_BUILD_MAX_ATTEMPTS: int = int(os.getenv("PLAYLIST_BUILD_MAX_ATTEMPTS", 3))
+
+    # Jobs each worker process runs at once, one thread apiece. A user waits on every
+    # queued build, so keep queue delay well under the loading page's timeout: raise
+    # this, or run more worker processes (e.g. `heroku ps:scale worker=3`), for launches.
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", 4))
+
+    # Connections the shared Spotify client keeps per host: one per request or job thread
+    # (web threads, or worker threads fanning out over pages and build stages) plus the
+    # batch pool. A call finding every connection busy waits for one rather than opening
+    # a throwaway connection, so a smaller value throttles instead of losing keep-alive.
+    WEB_THREADS: int = int(os.getenv("WEB_THREADS", 16))
+    SPOTIFY_POOL_MAXSIZE: int = int(
+        os.getenv("SPOTIFY_POOL_MAXSIZE", max(WEB_THREADS, WORKER_CONCURRENCY * 4) + SPOTIFY_BATCH_CONCURRENCY)
+    )
+
+    # Least time (seconds) between two refreshes of the same user's stored Spotify data
+    USER_DATA_REFRESH_INTERVAL: int = int(os.getenv("USER_DATA_REFRESH_INTERVAL", 3600))
+
+    # Lifetime of a user's prefetched top tracks (seconds)
+    PREFETCH_TTL: int = int(os.getenv("PREFETCH_TTL", 600))
+
+    # Per-stage timeouts of the playlist build graph (seconds)
+    PLAYLIST_STAGE_TIMEOUTS: Dict[str, float] = {
+        "tracks": float(os.getenv("PLAYLIST_STAGE_TIMEOUT_TRACKS", 60)),
+        "add_tracks": float(os.getenv("PLAYLIST_STAGE_TIMEOUT_ADD_TRACKS", 20)),
+        "cover": float(os.getenv("PLAYLIST_STAGE_TIMEOUT_COVER", 30)),
+        "follow": float(os.getenv("PLAYLIST_STAGE_TIMEOUT_FOLLOW", 10)),
+    }
+
+    # Access tokens are renewed this many seconds before they expire
+    SPOTIFY_TOKEN_REFRESH_MARGIN: int = int(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN", 300))
 
     # Environment setting
     ENV: str = os.getenv("FLASK_ENV", "development")
@@ -40,8 +131,16 @@ class Config:
     # Secondary database URL (postgresql://)
     DATABASE_2_URL = os.getenv('DATABASE_2_URL', '')
 
+    # Writes and read-your-writes lookups go to the default bind (db.session);
+    # reporting and export reads go through analytics_session(). Those read the
+    # default database over their own small pool unless DATABASE_ANALYTICS_BIND
+    # names another bind, which must be a follower of the default database
+    # (nothing writes or migrates it).
     SQLALCHEMY_DATABASE_URI = DATABASE_2_URL
-    SQLALCHEMY_BINDS = {'primary': DATABASE_URL}
+    SQLALCHEMY_ENGINE_OPTIONS = database_pool_options("default")
+    SQLALCHEMY_BINDS = {'primary': {'url': DATABASE_URL, **database_pool_options("primary", pool_size=3, max_overflow=2)}}
+    DATABASE_ANALYTICS_BIND = os.getenv("DATABASE_ANALYTICS_BIND") or None
+    DATABASE_ANALYTICS_ENGINE_OPTIONS = database_pool_options("analytics", pool_size=2, max_overflow=2)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 
@@ -61,7 +160,9 @@ class Config:
         "spotify:track:5tg10O76Ih5wI5I09QpqTU",
     ]
     
-    # Excluded music genres
+    # Excluded music genres. Entries match as whole words anywhere in a genre, so "rap"
+    # also excludes "emo rap" (but not "trap"); the two lists after it hold exact-name
+    # and raw substring rules.
     EXCLUDED_GENRES = [
         "rap",
         "drum and bass",
@@ -116,6 +217,20 @@ class Config:
         "rhythm game",
         "game"
     ]
+    EXCLUDED_GENRES_EXACT: List[str] = []
+    EXCLUDED_GENRES_SUBSTRING: List[str] = []
+
+    # Mood rules for playlist candidates. A track is in the mood if its valence/energy
+    # fall inside any window; "_min"/"_max" bounds are inclusive, "_below" is exclusive.
+    MOOD_RULES = {
+        "min_popularity": 20,
+        "max_tracks_per_artist": 4,
+        "windows": [
+            {"energy_below": 0.5, "valence_min": 0.3, "valence_max": 0.4},
+            {"valence_below": 0.3, "energy_min": 0.5, "energy_max": 0.6},
+            {"valence_max": 0.3, "energy_max": 0.5},
+        ],
+    }
 
 class DevelopmentConfig(Config):
     DEBUG: bool = True
@@ -0,0 +1,33 @@
+import argparse
+import sys
+
+from app import create_app
+from app.services.db_routing import analytics_session
+from app.services.user_export import EXPORT_AUDIENCES, EXPORT_FORMATS, UserExport, format_watermark, parse_watermark
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream opted-in users as CSV or NDJSON.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--audience", choices=sorted(EXPORT_AUDIENCES), default="any")
+    parser.add_argument(
+        "--since", type=parse_watermark, help="The watermark a previous export printed; only newer users are exported"
+    )
+    parser.add_argument("--output", help="File to write instead of stdout")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context(), analytics_session() as session:
+        until = UserExport(session, audience=args.audience).latest_watermark() or args.since
+        export = UserExport(session, audience=args.audience, since=args.since, until=until)
+        output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for chunk in export.lines(args.format):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+
+    # Reported on stderr so stdout stays a clean export
+    watermark = format_watermark(export.watermark) if export.watermark else ""
+    print(f"watermark: {watermark}", file=sys.stderr)
@@ -0,0 +1,66 @@
+"""Deduplicate user_data and make user_id unique
+
+The user_data table predates migrations; this is the baseline revision.
+
+Revision ID: 3f2a9c1d7b4e
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b4e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Per user, keep the fully processed row if there is one, otherwise the newest.
+    # Opt-ins and the email given on any duplicate are carried over to the kept row.
+    op.execute(sa.text("""
+        WITH ranked AS (
+            SELECT id, user_id,
+                   row_number() OVER (
+                       PARTITION BY user_id ORDER BY processed IS TRUE DESC, id DESC
+                   ) AS position
+            FROM user_data
+        ),
+        merged AS (
+            SELECT user_id,
+                   bool_or(mailing_list) AS mailing_list,
+                   bool_or(spotify_subscribe) AS spotify_subscribe,
+                   (array_agg(email ORDER BY id DESC) FILTER (WHERE email IS NOT NULL))[1] AS email
+            FROM user_data
+            GROUP BY user_id
+            HAVING count(*) > 1
+        )
+        UPDATE user_data
+        SET mailing_list = merged.mailing_list,
+            spotify_subscribe = merged.spotify_subscribe,
+            email = COALESCE(user_data.email, merged.email)
+        FROM ranked, merged
+        WHERE user_data.id = ranked.id
+          AND ranked.position = 1
+          AND merged.user_id = ranked.user_id
+    """))
+    op.execute(sa.text("""
+        DELETE FROM user_data
+        USING (
+            SELECT id,
+                   row_number() OVER (
+                       PARTITION BY user_id ORDER BY processed IS TRUE DESC, id DESC
+                   ) AS position
+            FROM user_data
+        ) AS ranked
+        WHERE user_data.id = ranked.id AND ranked.position > 1
+    """))
+    op.create_index('ix_user_data_user_id', 'user_data', ['user_id'], unique=True)
+
+
+def downgrade():
+    # Deleted duplicates are not restored
+    op.drop_index('ix_user_data_user_id', table_name='user_data')
@@ -0,0 +1,98 @@
+"""Normalized artists, tracks and user top items, backfilled from user_data JSON
+
+Revision ID: b7e41d2c9a05
+Revises: 3f2a9c1d7b4e
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e41d2c9a05'
+down_revision = '3f2a9c1d7b4e'
+branch_labels = None
+depends_on = None
+
+TOP_ITEM_COLUMNS = [
+    ('top_artists_long_term', 'artist', 'long_term'),
+    ('top_artists_medium_term', 'artist', 'medium_term'),
+    ('top_artists_short_term', 'artist', 'short_term'),
+    ('top_tracks_long_term', 'track', 'long_term'),
+    ('top_tracks_medium_term', 'track', 'medium_term'),
+    ('top_tracks_short_term', 'track', 'short_term'),
+]
+
+
+def _items(column, item_type):
+    # One row per list entry, with its 1-based rank and the ID parsed out of its Spotify URL
+    return f"""
+        SELECT user_data.user_id, entry.value AS item, entry.rank,
+               substring(entry.value->>'spotify_url' from '/{item_type}/([A-Za-z0-9]+)') AS item_id
+        FROM user_data,
+             json_array_elements(
+                 CASE WHEN json_typeof(user_data.{column}) = 'array' THEN user_data.{column} ELSE '[]'::json END
+             ) WITH ORDINALITY AS entry(value, rank)
+    """
+
+
+def upgrade():
+    op.create_table(
+        'artists',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'tracks',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=True),
+        sa.Column('artist_name', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'user_top_items',
+        sa.Column('user_id', sa.String(length=255), nullable=False),
+        sa.Column('item_type', sa.String(length=16), nullable=False),
+        sa.Column('time_range', sa.String(length=16), nullable=False),
+        sa.Column('rank', sa.SmallInteger(), nullable=False),
+        sa.Column('item_id', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user_data.user_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'item_type', 'time_range', 'rank'),
+    )
+
+    for column, item_type, time_range in TOP_ITEM_COLUMNS:
+        if item_type == 'artist':
+            op.execute(sa.text(f"""
+                INSERT INTO artists (id, name)
+                SELECT DISTINCT ON (item_id) item_id, item->>'name'
+                FROM ({_items(column, item_type)}) AS items
+                WHERE item_id IS NOT NULL
+                ON CONFLICT (id) DO NOTHING
+            """))
+        else:
+            op.execute(sa.text(f"""
+                INSERT INTO tracks (id, name, artist_name)
+                SELECT DISTINCT ON (item_id) item_id, item->>'track_name', item->>'artist_name'
+                FROM ({_items(column, item_type)}) AS items
+                WHERE item_id IS NOT NULL
+                ON CONFLICT (id) DO NOTHING
+            """))
+        op.execute(sa.text(f"""
+            INSERT INTO user_top_items (user_id, item_type, time_range, rank, item_id)
+            SELECT user_id, '{item_type}', '{time_range}', rank, item_id
+            FROM ({_items(column, item_type)}) AS items
+            WHERE item_id IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """))
+
+    # Built after the backfill, which is faster than maintaining it row by row
+    op.create_index('ix_user_top_items_item', 'user_top_items', ['item_type', 'item_id', 'time_range'])
+
+
+def downgrade():
+    op.drop_index('ix_user_top_items_item', table_name='user_top_items')
+    op.drop_table('user_top_items')
+    op.drop_table('tracks')
+    op.drop_table('artists')
@@ -0,0 +1,27 @@
+"""Section hashes and refresh time for user_data snapshots
+
+Revision ID: c91d5e3f0a27
+Revises: b7e41d2c9a05
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c91d5e3f0a27'
+down_revision = 'b7e41d2c9a05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start without hashes, so their first refresh rewrites every section once
+    op.add_column('user_data', sa.Column('section_hashes', sa.JSON(), nullable=True))
+    op.add_column('user_data', sa.Column('refreshed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user_data', 'refreshed_at')
+    op.drop_column('user_data', 'section_hashes')
@@ -0,0 +1,29 @@
+"""Backfill and require user_data.created_at
+
+Revision ID: e4a8b6c2d913
+Revises: c91d5e3f0a27
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a8b6c2d913'
+down_revision = 'c91d5e3f0a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Incremental user exports page on created_at; rows without one would never be picked up,
+    # so they are stamped now and show up in the next export
+    op.execute("UPDATE user_data SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('user_data', 'created_at', existing_type=sa.DateTime(), nullable=False,
+                    server_default=sa.text('now()'))
+
+
+def downgrade():
+    op.alter_column('user_data', 'created_at', existing_type=sa.DateTime(), nullable=True,
+                    server_default=None)
@@ -0,0 +1,236 @@
+"""Local stand-in for the Spotify Web API and accounts service.
+
+Point the app at it with::
+
+    SPOTIFY_API_BASE_URL=http://localhost:5001/v1/
+    SPOTIFY_ACCOUNTS_BASE_URL=http://localhost:5001/accounts/
+
+and run ``python -m spotify_stub``. Latency and failures are injected from
+the ``STUB_*`` environment variables so auth -> callback ->
+/create_playlist_background can be load-tested repeatably offline.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+from flask import Flask, abort, jsonify, redirect, request
+
+from .fixtures import CURATED_PLAYLIST_ID, Catalog, spotify_id
+
+
+class StubConfig:
+    STUB_SEED: int = int(os.getenv("STUB_SEED", 1))
+    # Mean added latency per call and its +/- jitter, in milliseconds
+    STUB_LATENCY_MS: float = float(os.getenv("STUB_LATENCY_MS", 80))
+    STUB_LATENCY_JITTER_MS: float = float(os.getenv("STUB_LATENCY_JITTER_MS", 40))
+    # Fraction of calls answered with 429 / 5xx
+    STUB_429_RATE: float = float(os.getenv("STUB_429_RATE", 0.0))
+    STUB_5XX_RATE: float = float(os.getenv("STUB_5XX_RATE", 0.0))
+    STUB_RETRY_AFTER: int = int(os.getenv("STUB_RETRY_AFTER", 1))
+
+
+def _page(items, limit, offset, total, base_url):
+    next_url = None
+    if offset + limit < total:
+        next_url = f"{base_url}?{urlencode({**request.args, 'offset': offset + limit, 'limit': limit})}"
+    return {
+        "href": request.url,
+        "items": items,
+        "limit": limit,
+        "offset": offset,
+        "total": total,
+        "next": next_url,
+        "previous": None,
+    }
+
+
+def create_stub_app(config_class=StubConfig):
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    catalog = Catalog(seed=app.config["STUB_SEED"])
+    playlists = {
+        CURATED_PLAYLIST_ID: {
+            "owner": "cassiehenderson",
+            "name": "cool girls cry",
+            "snapshot_id": catalog.curated_snapshot_id,
+            "uris": [catalog.tracks[track_id]["uri"] for track_id in catalog.curated_track_ids],
+        }
+    }
+    following = {}
+    tracks_by_uri = {track["uri"]: track for track in catalog.tracks.values()}
+    lock = threading.Lock()
+
+    def current_user():
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer stub:"):
+            abort(401)
+        return header.split(":")[1]
+
+    def ids_param(limit=50):
+        ids = [track_id for track_id in request.args.get("ids", "").split(",") if track_id]
+        if not ids or len(ids) > limit:
+            abort(400)
+        return ids
+
+    @app.before_request
+    def inject_latency_and_faults():
+        latency = app.config["STUB_LATENCY_MS"] + random.uniform(
+            -app.config["STUB_LATENCY_JITTER_MS"], app.config["STUB_LATENCY_JITTER_MS"]
+        )
+        time.sleep(max(0.0, latency) / 1000)
+        roll = random.random()
+        if roll < app.config["STUB_429_RATE"]:
+            response = jsonify({"error": {"status": 429, "message": "API rate limit exceeded"}})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(app.config["STUB_RETRY_AFTER"])
+            return response
+        if roll < app.config["STUB_429_RATE"] + app.config["STUB_5XX_RATE"]:
+            status = random.choice([500, 502, 503])
+            response = jsonify({"error": {"status": status, "message": "Server error"}})
+            response.status_code = status
+            return response
+        return None
+
+    @app.after_request
+    def conditional_get(response):
+        if request.method == "GET" and response.status_code == 200 and response.is_json:
+            response.add_etag()
+            response.make_conditional(request)
+        return response
+
+    # Accounts service
+
+    @app.route("/accounts/authorize")
+    def authorize():
+        code = f"user-{uuid.uuid4().hex[:12]}"
+        query = urlencode({"code": code, "state": request.args.get("state", "")})
+        return redirect(f"{request.args['redirect_uri']}?{query}")
+
+    @app.route("/accounts/api/token", methods=["POST"])
+    def token():
+        grant_type = request.form.get("grant_type")
+        if grant_type == "authorization_code":
+            user_key = request.form["code"]
+        elif grant_type == "refresh_token":
+            user_key = request.form["refresh_token"].split(":")[1]
+        elif "token" in request.form:
+            return "", 200
+        else:
+            abort(400)
+        data = {
+            "access_token": f"stub:{user_key}:{uuid.uuid4().hex}",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "scope": "user-top-read user-read-email playlist-modify-private playlist-modify-public",
+        }
+        if grant_type == "authorization_code":
+            data["refresh_token"] = f"refresh:{user_key}:{uuid.uuid4().hex}"
+        return jsonify(data)
+
+    # Web API
+
+    @app.route("/v1/me")
+    def me():
+        return jsonify(catalog.user_profile(current_user()))
+
+    @app.route("/v1/me/top/<item_type>")
+    def top_items(item_type):
+        user_key = current_user()
+        limit = min(int(request.args.get("limit", 20)), 50)
+        offset = int(request.args.get("offset", 0))
+        time_range = request.args.get("time_range", "medium_term")
+        if item_type == "tracks":
+            ids = catalog.top_tracks(user_key, time_range)
+            items = [catalog.tracks[track_id] for track_id in ids[offset:offset + limit]]
+        elif item_type == "artists":
+            ids = catalog.top_artists(user_key, time_range)
+            items = [catalog.artists[artist_id] for artist_id in ids[offset:offset + limit]]
+        else:
+            abort(404)
+        return jsonify(_page(items, limit, offset, len(ids), request.base_url))
+
+    @app.route("/v1/audio-features")
+    def audio_features():
+        current_user()
+        return jsonify({"audio_features": [catalog.audio_features.get(track_id) for track_id in ids_param(100)]})
+
+    @app.route("/v1/artists")
+    def artists():
+        current_user()
+        return jsonify({"artists": [catalog.artists.get(artist_id) for artist_id in ids_param(50)]})
+
+    @app.route("/v1/me/following", methods=["GET", "PUT"])
+    def me_following():
+        user_key = current_user()
+        if request.method == "PUT":
+            with lock:
+                following.setdefault(user_key, set()).update(ids_param(50))
+            return "", 204
+        artist_ids = sorted(following.get(user_key, set())) or catalog.top_artists(user_key, "long_term")[:10]
+        limit = min(int(request.args.get("limit", 20)), 50)
+        items = [catalog.artists[artist_id] for artist_id in artist_ids[:limit]]
+        return jsonify({"artists": {"items": items, "limit": limit, "total": len(artist_ids), "next": None,
+                                    "cursors": {"after": None}}})
+
+    @app.route("/v1/users/<user_id>/playlists", methods=["GET", "POST"])
+    def user_playlists(user_id):
+        current_user()
+        if request.method == "POST":
+            playlist_id = spotify_id(random)
+            body = request.get_json()
+            with lock:
+                playlists[playlist_id] = {
+                    "owner": user_id, "name": body["name"], "snapshot_id": spotify_id(random), "uris": [],
+                }
+            return jsonify({"id": playlist_id, "name": body["name"], "public": body.get("public", False),
+                            "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"}}), 201
+        owned = [(pid, p) for pid, p in playlists.items() if p["owner"] == user_id]
+        limit = min(int(request.args.get("limit", 20)), 50)
+        items = [
+            {"id": pid, "name": p["name"], "external_urls": {"spotify": f"https://open.spotify.com/playlist/{pid}"}}
+            for pid, p in owned[:limit]
+        ]
+        return jsonify(_page(items, limit, 0, len(owned), request.base_url))
+
+    @app.route("/v1/playlists/<playlist_id>")
+    def playlist(playlist_id):
+        current_user()
+        if playlist_id not in playlists:
+            abort(404)
+        data = playlists[playlist_id]
+        return jsonify({"id": playlist_id, "name": data["name"], "snapshot_id": data["snapshot_id"]})
+
+    @app.route("/v1/playlists/<playlist_id>/tracks", methods=["GET", "POST", "PUT"])
+    def playlist_tracks(playlist_id):
+        current_user()
+        if playlist_id not in playlists:
+            abort(404)
+        data = playlists[playlist_id]
+        if request.method in ("POST", "PUT"):
+            uris = (request.get_json(silent=True) or {}).get("uris", [])
+            if len(uris) > 100:
+                abort(400)
+            with lock:
+                if request.method == "PUT":
+                    data["uris"] = list(uris)
+                else:
+                    data["uris"].extend(uris)
+                data["snapshot_id"] = spotify_id(random)
+            return jsonify({"snapshot_id": data["snapshot_id"]}), 201
+
+        limit = min(int(request.args.get("limit", 100)), 100)
+        offset = int(request.args.get("offset", 0))
+        items = [{"track": tracks_by_uri.get(uri)} for uri in data["uris"][offset:offset + limit]]
+        return jsonify(_page(items, limit, offset, len(data["uris"]), request.base_url))
+
+    @app.route("/v1/playlists/<playlist_id>/images", methods=["PUT"])
+    def playlist_image(playlist_id):
+        current_user()
+        if playlist_id not in playlists:
+            abort(404)
+        return "", 202
+
+    return app
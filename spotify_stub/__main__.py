@@ -0,0 +1,6 @@
+import os
+
+from . import create_stub_app
+
+if __name__ == "__main__":
+    create_stub_app().run(port=int(os.getenv("STUB_PORT", 5001)), threaded=True)
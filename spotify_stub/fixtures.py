@@ -0,0 +1,141 @@
+import random
+import string
+
+# Genre strings as Spotify spells them, mixing ones the playlist keeps and ones it excludes
+GENRES = [
+    "indie pop", "bedroom pop", "sad girl", "art pop", "chamber pop", "indie folk",
+    "singer-songwriter", "alt z", "dream pop", "shoegaze", "slowcore", "indie rock",
+    "modern alternative rock", "pop", "dance pop", "electropop", "uk pop", "australian pop",
+    "folk-pop", "emo", "midwest emo", "pop punk", "neo soul", "r&b", "alternative r&b",
+    "emo rap", "rap", "hip hop", "trap", "melodic rap", "deep house", "house",
+    "anime", "anime rock", "soundtrack", "video game music", "classical", "ambient",
+    "lo-fi beats", "k-pop", "k-pop girl group", "idol", "country", "modern country pop",
+]
+
+TITLE_WORDS = [
+    "blue", "midnight", "glass", "honey", "ghost", "paper", "cherry", "static", "velvet",
+    "winter", "ocean", "bruise", "sugar", "satellite", "heart", "mirror", "ashes", "summer",
+    "silence", "rain", "pink", "golden", "lonely", "teeth", "letters", "crying", "youth",
+]
+
+ARTIST_WORDS = [
+    "the", "girl", "moon", "wolves", "saint", "lana", "phoebe", "boy", "club", "violet",
+    "harbor", "lucy", "jules", "city", "kids", "mae", "sister", "arcade", "echo", "june",
+]
+
+CURATED_PLAYLIST_ID = "6Z8G9W9F4pCGon5iEJI2ly"
+FEATURED_ARTIST_ID = "2lZ09YCpdWMMmBTSdDqspr"
+
+
+def spotify_id(rng):
+    return "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(22))
+
+
+def _title(rng, words, count):
+    return " ".join(rng.choice(words) for _ in range(count)).title()
+
+
+class Catalog:
+    """Deterministic stand-in for Spotify's catalogue.
+
+    Artists, tracks and audio features are generated from ``seed`` so every
+    load-test run sees the same data, with popularity following a long tail
+    so that, like real users, many users share the same popular top tracks.
+    """
+
+    def __init__(self, seed=1, artist_count=400, track_count=3000, curated_size=300):
+        rng = random.Random(seed)
+
+        self.artists = {}
+        artist_ids = [FEATURED_ARTIST_ID] + [spotify_id(rng) for _ in range(artist_count - 1)]
+        for artist_id in artist_ids:
+            self.artists[artist_id] = {
+                "id": artist_id,
+                "name": _title(rng, ARTIST_WORDS, rng.randint(1, 3)),
+                "type": "artist",
+                "uri": f"spotify:artist:{artist_id}",
+                "popularity": rng.randint(5, 95),
+                "followers": {"href": None, "total": rng.randint(100, 5_000_000)},
+                "genres": rng.sample(GENRES, rng.randint(0, 4)),
+                "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+                "images": [],
+            }
+
+        self.tracks = {}
+        self.audio_features = {}
+        for _ in range(track_count):
+            track_id = spotify_id(rng)
+            credited = rng.sample(artist_ids, 1 if rng.random() < 0.8 else 2)
+            self.tracks[track_id] = {
+                "id": track_id,
+                "name": _title(rng, TITLE_WORDS, rng.randint(1, 4)),
+                "type": "track",
+                "uri": f"spotify:track:{track_id}",
+                "popularity": int(min(100, rng.paretovariate(1.5) * 12)),
+                "duration_ms": rng.randint(120_000, 320_000),
+                "explicit": rng.random() < 0.2,
+                "artists": [
+                    {
+                        "id": artist_id,
+                        "name": self.artists[artist_id]["name"],
+                        "type": "artist",
+                        "uri": f"spotify:artist:{artist_id}",
+                        "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+                    }
+                    for artist_id in credited
+                ],
+                "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+            }
+            # A few tracks have no analysis, as on Spotify
+            if rng.random() < 0.02:
+                self.audio_features[track_id] = None
+                continue
+            self.audio_features[track_id] = {
+                "id": track_id,
+                "type": "audio_features",
+                "uri": f"spotify:track:{track_id}",
+                "danceability": round(rng.random(), 3),
+                "energy": round(rng.betavariate(2, 3), 3),
+                "key": rng.randint(0, 11),
+                "loudness": round(rng.uniform(-20, -3), 3),
+                "mode": rng.randint(0, 1),
+                "speechiness": round(rng.uniform(0.02, 0.4), 4),
+                "acousticness": round(rng.random(), 4),
+                "instrumentalness": round(rng.random() ** 4, 4),
+                "liveness": round(rng.uniform(0.05, 0.6), 4),
+                "valence": round(rng.betavariate(2, 3), 3),
+                "tempo": round(rng.uniform(60, 180), 3),
+                "duration_ms": self.tracks[track_id]["duration_ms"],
+                "time_signature": 4,
+            }
+
+        self.by_popularity = sorted(self.tracks, key=lambda t: self.tracks[t]["popularity"], reverse=True)
+        self.curated_track_ids = rng.sample(list(self.tracks), curated_size)
+        self.curated_snapshot_id = spotify_id(rng)
+
+    def top_tracks(self, user_key, time_range, count=200):
+        """The user's top tracks: mostly drawn from the popular head of the catalogue."""
+        rng = random.Random(f"{user_key}:{time_range}")
+        head = self.by_popularity[: count * 3]
+        picks = rng.sample(head, int(count * 0.7)) + rng.sample(self.by_popularity, count)
+        return list(dict.fromkeys(picks))[:count]
+
+    def top_artists(self, user_key, time_range, count=50):
+        artist_ids = []
+        for track_id in self.top_tracks(user_key, time_range):
+            artist_ids.extend(artist["id"] for artist in self.tracks[track_id]["artists"])
+        return list(dict.fromkeys(artist_ids))[:count]
+
+    def user_profile(self, user_key):
+        return {
+            "id": user_key,
+            "display_name": user_key.replace("-", " ").title(),
+            "email": f"{user_key}@example.com",
+            "country": "AU",
+            "product": "premium",
+            "type": "user",
+            "uri": f"spotify:user:{user_key}",
+            "followers": {"href": None, "total": random.Random(user_key).randint(0, 500)},
+            "images": [{"url": f"https://i.scdn.co/image/{user_key}", "height": 300, "width": 300}],
+            "external_urls": {"spotify": f"https://open.spotify.com/user/{user_key}"},
+        }
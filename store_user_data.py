@@ -1,17 +1,56 @@
+import argparse
+import functools
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
 import requests
+from flask import current_app, has_app_context
+from sqlalchemy.orm import load_only
 
-from flask import current_app
 from app import create_app
-from app.models import UserData, db
+from app.models import UserData, db, store_top_items, upsert_user_data
+from app.services.batching import with_app_context
+from app.services.job_queue import JobQueue
+from app.services.redis_client import get_redis_client
+from app.services.spotify_client import get_spotify_client
+from app.services.spotify_service import SpotifyService
+from config import Config
+
+# Highest UserData.id the backfill has committed; lets an interrupted run resume
+BACKFILL_CHECKPOINT_KEY = "backfill:user_data:last_id"
+
+USER_DATA_QUEUE = "user_data"
 
+# Sections of a stored user snapshot; each is hashed, compared and rewritten as a unit
+PROFILE_COLUMNS = ("display_name", "followers", "image_url", "email")
+SNAPSHOT_SECTIONS = {
+    "profile": PROFILE_COLUMNS,
+    **{
+        column: (column,)
+        for column in (
+            "followed_artists",
+            "top_artists_long_term",
+            "top_artists_medium_term",
+            "top_artists_short_term",
+            "top_tracks_long_term",
+            "top_tracks_medium_term",
+            "top_tracks_short_term",
+            "playlists",
+        )
+    },
+}
 
-def get_followed_artists(access_token, limit=20, after=None):
-    endpoint = "https://api.spotify.com/v1/me/following"
+
+def get_followed_artists(access_token, limit=20, after=None, spotify_user_id=None):
+    endpoint = f"{Config.SPOTIFY_API_BASE_URL}me/following"
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"type": "artist", "limit": limit}
     if after:
         params["after"] = after
-    response = requests.get(endpoint, headers=headers, params=params)
+    response = get_spotify_client().get(endpoint, headers=headers, params=params, spotify_user_id=spotify_user_id)
+    response.raise_for_status()
     data = response.json()
     if "artists" in data and "items" in data["artists"]:
         # Extract only the name and Spotify URL for each artist
@@ -24,10 +63,11 @@ def get_followed_artists(access_token, limit=20, after=None):
 
 
 def get_user_playlists(access_token, user_id, limit=10):
-    endpoint = f"https://api.spotify.com/v1/users/{user_id}/playlists"
+    endpoint = f"{Config.SPOTIFY_API_BASE_URL}users/{user_id}/playlists"
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"limit": limit}
-    response = requests.get(endpoint, headers=headers, params=params)
+    response = get_spotify_client().get(endpoint, headers=headers, params=params, spotify_user_id=user_id)
+    response.raise_for_status()
     playlists = response.json().get("items", [])
 
     return [
@@ -36,11 +76,12 @@ def get_user_playlists(access_token, user_id, limit=10):
     ]
 
 
-def get_user_top_items(access_token, item_type, time_range="medium_term", limit=20):
-    endpoint = f"https://api.spotify.com/v1/me/top/{item_type}"
+def get_user_top_items(access_token, item_type, time_range="medium_term", limit=20, spotify_user_id=None):
+    endpoint = f"{Config.SPOTIFY_API_BASE_URL}me/top/{item_type}"
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"limit": limit, "time_range": time_range}
-    response = requests.get(endpoint, headers=headers, params=params)
+    response = get_spotify_client().get(endpoint, headers=headers, params=params, spotify_user_id=spotify_user_id)
+    response.raise_for_status()
     items = response.json().get("items", [])
 
     if item_type == "artists":
@@ -63,10 +104,11 @@ def get_user_top_items(access_token, item_type, time_range="medium_term", limit=
     return []
 
 
-def get_user_profile(access_token):
-    endpoint = f"https://api.spotify.com/v1/me"
+def get_user_profile(access_token, spotify_user_id=None):
+    endpoint = f"{Config.SPOTIFY_API_BASE_URL}me"
     headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(endpoint, headers=headers)
+    response = get_spotify_client().get(endpoint, headers=headers, spotify_user_id=spotify_user_id)
+    response.raise_for_status()
     data = response.json()
     return {
         "display_name": data.get("display_name"),
@@ -77,100 +119,213 @@ def get_user_profile(access_token):
         ),
     }
 
-def store_user_data(user_id, access_token, refresh_token=None, mailing_list=False, spotify_subscribe=False):
-    app = create_app()
-    with app.app_context():
-        # Get user profile data
-        profile_data = get_user_profile(access_token)
-        display_name = profile_data["display_name"]
-        followers = profile_data["followers"]
-        image_url = profile_data["image_url"]
-        email = profile_data.get("email")
-
-        # Get followed artists
-        followed_artists = get_followed_artists(access_token, limit=20)
-        app.logger.debug(f"Followed artists: {followed_artists}")
-
-        # Get user's top items with modified structure
-        top_data = {
-            "top_artists_long": get_user_top_items(access_token, "artists", "long_term"),
-            "top_artists_medium": get_user_top_items(access_token, "artists", "medium_term"),
-            "top_artists_short": get_user_top_items(access_token, "artists", "short_term"),
-            "top_tracks_long": get_user_top_items(access_token, "tracks", "long_term"),
-            "top_tracks_medium": get_user_top_items(access_token, "tracks", "medium_term"),
-            "top_tracks_short": get_user_top_items(access_token, "tracks", "short_term"),
-        }
-
-        # Get user's playlists
-        playlists = get_user_playlists(access_token, user_id, limit=10)
-
-        # Store data in the database
-        user_data = UserData.query.filter_by(user_id=user_id).first()
-        if user_data:
-            # Update existing user data
-            user_data.display_name = display_name
-            user_data.followers = followers
-            user_data.image_url = image_url
-            user_data.email = email
-            user_data.followed_artists = followed_artists
-            user_data.top_artists_long_term = top_data["top_artists_long"]
-            user_data.top_artists_medium_term = top_data["top_artists_medium"]
-            user_data.top_artists_short_term = top_data["top_artists_short"]
-            user_data.top_tracks_long_term = top_data["top_tracks_long"]
-            user_data.top_tracks_medium_term = top_data["top_tracks_medium"]
-            user_data.top_tracks_short_term = top_data["top_tracks_short"]
-            user_data.playlists = playlists
-            user_data.access_token = access_token
-            user_data.refresh_token = refresh_token
-            user_data.mailing_list = mailing_list
-            user_data.spotify_subscribe = spotify_subscribe
-            user_data.processed = True
-        else:
-            # Create new user data
-            user_data = UserData(
-                user_id=user_id,
-                display_name=display_name,
-                followers=followers,
-                image_url=image_url,
-                email=email,
-                followed_artists=followed_artists,
-                top_artists_long_term=top_data["top_artists_long"],
-                top_artists_medium_term=top_data["top_artists_medium"],
-                top_artists_short_term=top_data["top_artists_short"],
-                top_tracks_long_term=top_data["top_tracks_long"],
-                top_tracks_medium_term=top_data["top_tracks_medium"],
-                top_tracks_short_term=top_data["top_tracks_short"],
-                playlists=playlists,
-                access_token=access_token,
-                refresh_token=refresh_token,
-                mailing_list=mailing_list,
-                spotify_subscribe=spotify_subscribe,
-                processed=True,
+
+def fetch_user_data(user_id, access_token):
+    """Fetch everything stored about a user from Spotify, as UserData column values."""
+    profile_data = get_user_profile(access_token, spotify_user_id=user_id)
+    return {
+        "display_name": profile_data["display_name"],
+        "followers": profile_data["followers"],
+        "image_url": profile_data["image_url"],
+        "email": profile_data.get("email"),
+        "followed_artists": get_followed_artists(access_token, limit=20, spotify_user_id=user_id),
+        "top_artists_long_term": get_user_top_items(access_token, "artists", "long_term", spotify_user_id=user_id),
+        "top_artists_medium_term": get_user_top_items(access_token, "artists", "medium_term", spotify_user_id=user_id),
+        "top_artists_short_term": get_user_top_items(access_token, "artists", "short_term", spotify_user_id=user_id),
+        "top_tracks_long_term": get_user_top_items(access_token, "tracks", "long_term", spotify_user_id=user_id),
+        "top_tracks_medium_term": get_user_top_items(access_token, "tracks", "medium_term", spotify_user_id=user_id),
+        "top_tracks_short_term": get_user_top_items(access_token, "tracks", "short_term", spotify_user_id=user_id),
+        "playlists": get_user_playlists(access_token, user_id, limit=10),
+    }
+
+
+def hash_sections(fetched):
+    """Content hash of each snapshot section of the fetched data."""
+    return {
+        section: hashlib.sha1(
+            json.dumps([fetched[column] for column in columns], sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+        for section, columns in SNAPSHOT_SECTIONS.items()
+    }
+
+
+def apply_user_data(user_data, fetched):
+    for column, value in fetched.items():
+        setattr(user_data, column, value)
+    user_data.section_hashes = hash_sections(fetched)
+    user_data.refreshed_at = db.func.now()
+    user_data.processed = True
+
+
+def store_user_data(user_id, access_token, refresh_token=None, mailing_list=False, spotify_subscribe=False,
+                    force=False):
+    """Refresh the user's stored Spotify snapshot.
+
+    Users refreshed less than USER_DATA_REFRESH_INTERVAL ago are skipped
+    (unless ``force``), and only sections whose content hash changed are
+    written, so an unchanged user costs one small indexed read.
+    """
+    if not has_app_context():
+        with create_app().app_context():
+            return store_user_data(user_id, access_token, refresh_token, mailing_list, spotify_subscribe, force)
+
+    recent = UserData.refreshed_at > db.func.now() - timedelta(seconds=Config.USER_DATA_REFRESH_INTERVAL)
+    snapshot = (
+        db.session.query(UserData.section_hashes, recent.label("recent"))
+        .filter_by(user_id=user_id)
+        .first()
+    )
+    if snapshot and snapshot.recent and not force:
+        current_app.logger.debug(f"Skipping refresh of user_id {user_id}: refreshed recently")
+        return
+
+    fetched = fetch_user_data(user_id, access_token)
+    current_app.logger.debug(f"Followed artists: {fetched['followed_artists']}")
+
+    hashes = hash_sections(fetched)
+    stored_hashes = (snapshot.section_hashes if snapshot else None) or {}
+    changed = [section for section, digest in hashes.items() if stored_hashes.get(section) != digest]
+    changed_values = {column: fetched[column] for section in changed for column in SNAPSHOT_SECTIONS[section]}
+
+    # Store data in the database
+    values = dict(
+        changed_values,
+        section_hashes=hashes,
+        refreshed_at=db.func.now(),
+        access_token=access_token,
+        refresh_token=refresh_token,
+        mailing_list=mailing_list,
+        spotify_subscribe=spotify_subscribe,
+        processed=True,
+    )
+    if not upsert_user_data(user_id, **values):
+        current_app.logger.warning(f"Not storing user data for user_id {user_id}: no row and no refresh token")
+        db.session.rollback()
+        return
+    store_top_items(user_id, changed_values)
+    db.session.commit()
+
+    current_app.logger.debug(f"Stored user data - user_id: {user_id}, changed sections: {changed}, mailing_list: {mailing_list}, spotify_subscribe: {spotify_subscribe}, refresh_token: {'Present' if refresh_token else 'Not present'}")
+
+
+def get_user_data_queue():
+    # A user's finished job blocks new ones until it expires, so repeat visits don't refetch
+    return JobQueue(
+        get_redis_client(),
+        USER_DATA_QUEUE,
+        job_ttl=Config.USER_DATA_REFRESH_INTERVAL,
+        visibility_timeout=Config.JOB_VISIBILITY_TIMEOUT,
+    )
+
+
+def ingest_user_data(user_id, token_key, mailing_list=False, spotify_subscribe=False, spotify_service=None):
+    """Worker side of the write-behind path: store a user queued by /playlist_created.
+
+    ``user_id`` is the Spotify user ID the row is stored under; ``token_key``
+    is the key the user's tokens are stored under in the token manager.
+    """
+    spotify_service = spotify_service or SpotifyService()
+    access_token = spotify_service.get_access_token(token_key)
+    if not access_token:
+        raise RuntimeError(f"No access token stored under {token_key} for user {user_id}")
+    store_user_data(
+        user_id,
+        access_token,
+        spotify_service.token_manager.get_refresh_token(token_key),
+        mailing_list,
+        spotify_subscribe,
+    )
+
+
+def fetch_for_backfill(spotify_service, user_id, access_token, refresh_token):
+    """Fetch a user's data, refreshing their stored access token once if Spotify rejects it.
+
+    Returns ``(fetched, token_data)``; ``token_data`` is None unless a refresh happened.
+    """
+    try:
+        return fetch_user_data(user_id, access_token), None
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 401 or not refresh_token:
+            raise
+
+    token_data = spotify_service.get_or_refresh_access_token(refresh_token=refresh_token)
+    if not token_data:
+        raise RuntimeError("Could not refresh the stored access token")
+    return fetch_user_data(user_id, token_data["access_token"]), token_data
+
+
+def backfill_user_data(chunk_size=100, workers=8, reset=False):
+    """Fetch and store Spotify data for every unprocessed user.
+
+    Users are read in keyset chunks by ID, their Spotify calls are spread
+    over a thread pool, and each chunk is committed at once. After every
+    commit the last ID is checkpointed in Redis, so an interrupted run picks
+    up after the last committed chunk. Users that fail are logged and left
+    unprocessed; since the checkpoint is cleared once a run completes, the
+    next run retries them.
+    """
+    redis_client = get_redis_client()
+    if reset:
+        redis_client.delete(BACKFILL_CHECKPOINT_KEY)
+    last_id = int(redis_client.get(BACKFILL_CHECKPOINT_KEY) or 0)
+    if last_id:
+        current_app.logger.info(f"Resuming backfill after user data id {last_id}")
+
+    fetch = with_app_context(functools.partial(fetch_for_backfill, SpotifyService(redis_client)))
+    processed = failed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        while True:
+            chunk = (
+                UserData.query.options(
+                    load_only(UserData.id, UserData.user_id, UserData.access_token, UserData.refresh_token)
+                )
+                .filter(UserData.processed.is_(False), UserData.id > last_id)
+                .order_by(UserData.id)
+                .limit(chunk_size)
+                .all()
             )
-            db.session.add(user_data)
+            if not chunk:
+                break
 
-        db.session.commit()
+            # Worker threads only see plain values; the ORM objects stay on this thread
+            futures = {
+                pool.submit(fetch, user.user_id, user.access_token, user.refresh_token): user
+                for user in chunk
+            }
+            for future in as_completed(futures):
+                user = futures[future]
+                try:
+                    fetched, token_data = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    current_app.logger.error(f"Error processing user data for user_id {user.user_id}: {e}")
+                    failed += 1
+                    continue
+                apply_user_data(user, fetched)
+                store_top_items(user.user_id, fetched)
+                if token_data:
+                    user.access_token = token_data["access_token"]
+                    user.refresh_token = token_data.get("refresh_token", user.refresh_token)
+                processed += 1
+
+            last_id = chunk[-1].id
+            db.session.commit()
+            redis_client.set(BACKFILL_CHECKPOINT_KEY, last_id)
+            current_app.logger.info(
+                f"Backfill committed through id {last_id}: {processed} processed, {failed} failed"
+            )
+
+    redis_client.delete(BACKFILL_CHECKPOINT_KEY)
+    current_app.logger.info(f"Backfill finished: {processed} processed, {failed} failed")
+    return processed, failed
 
-        app.logger.debug(f"Stored user data - user_id: {user_id}, mailing_list: {mailing_list}, spotify_subscribe: {spotify_subscribe}, refresh_token: {'Present' if refresh_token else 'Not present'}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch and store Spotify data for unprocessed users.")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Users committed per chunk")
+    parser.add_argument("--workers", type=int, default=Config.SPOTIFY_BATCH_CONCURRENCY, help="Concurrent users")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start from the first user")
+    args = parser.parse_args()
+
     app = create_app()
     with app.app_context():
-        unprocessed_users = UserData.query.filter_by(processed=False).all()
-        for user_data in unprocessed_users:
-            try:
-                store_user_data(
-                    user_data.user_id,
-                    user_data.access_token,
-                    user_data.refresh_token,  
-                    user_data.mailing_list,
-                    user_data.spotify_subscribe, 
-                )
-                user_data.processed = True
-                db.session.commit()
-            except Exception as e:
-                app.logger.error(
-                    f"Error processing user data for user_id {user_data.user_id}: {e}"
-                )
-                db.session.rollback()
-                db.session.rollback()
+        backfill_user_data(chunk_size=args.chunk_size, workers=args.workers, reset=args.reset)
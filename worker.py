@@ -0,0 +1,110 @@
+import signal
+import sys
+import threading
+import time
+
+from app import create_app
+from app.models import db
+from app.services.build_progress import BuildProgress
+from app.services.job_queue import reserve_any
+from app.services.playlist_build_service import PlaylistBuildService, get_playlist_build_queue
+from app.services.redis_client import get_redis_client
+from store_user_data import get_user_data_queue, ingest_user_data
+
+app = create_app()
+stopping = threading.Event()
+
+# How often (seconds) jobs left behind by dead workers are put back on their queues
+REQUEUE_INTERVAL = 30
+
+
+def stop(signum, frame):
+    app.logger.info(f"Received signal {signum}, finishing current jobs and exiting")
+    stopping.set()
+
+
+def work(index):
+    with app.app_context():
+        build_queue = get_playlist_build_queue()
+        user_data_queue = get_user_data_queue()
+        progress = BuildProgress(get_redis_client())
+        next_requeue = 0
+        while not stopping.is_set():
+            # One thread per process is enough to sweep up jobs left behind by dead workers
+            if index == 0 and time.monotonic() >= next_requeue:
+                for queue in (build_queue, user_data_queue):
+                    requeued = queue.requeue_stale()
+                    if requeued:
+                        app.logger.warning(f"Requeued {requeued} stale {queue.name} jobs")
+                next_requeue = time.monotonic() + REQUEUE_INTERVAL
+            # Playlist builds come first: a user is waiting on them, nobody waits on user data
+            job = reserve_any([build_queue, user_data_queue], timeout=5)
+            if job is None:
+                continue
+            queue, job_id, payload = job
+            if queue is build_queue:
+                build_playlist(build_queue, job_id, payload, progress)
+            else:
+                ingest(user_data_queue, job_id, payload)
+
+
+def run():
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Each thread runs its own reserve/process loop, so a process works on
+    # WORKER_CONCURRENCY jobs at once; scale further with more worker processes
+    concurrency = app.config["WORKER_CONCURRENCY"]
+    threads = [
+        threading.Thread(target=work, args=(index,), name=f"worker-{index}", daemon=True)
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    app.logger.info(f"Worker started with {concurrency} threads")
+    # Wait in short slices rather than join() so the main thread keeps handling signals
+    while not stopping.is_set() and all(thread.is_alive() for thread in threads):
+        stopping.wait(1)
+    crashed = not stopping.is_set()
+    stopping.set()
+    for thread in threads:
+        thread.join()
+    if crashed:
+        # Let the process manager restart the worker rather than run on with fewer threads
+        app.logger.error("A worker thread exited unexpectedly, shutting down")
+        sys.exit(1)
+
+
+def build_playlist(queue, playlist_id, payload, progress):
+    try:
+        PlaylistBuildService(progress=progress).build(
+            playlist_id, payload["user_id"], payload["playlist_name"]
+        )
+        queue.complete(playlist_id)
+        progress.publish(playlist_id, "ready")
+    except Exception as e:
+        app.logger.error(f"Error in creating playlist {playlist_id}: {e}", exc_info=True)
+        if queue.fail(playlist_id, e):
+            # The loading page keeps waiting while the build is queued again
+            app.logger.info(f"Requeued playlist build {playlist_id} for another attempt")
+            progress.publish(playlist_id, "queued")
+        else:
+            progress.publish(playlist_id, "error")
+
+
+def ingest(queue, user_id, payload):
+    try:
+        ingest_user_data(
+            user_id, payload["token_key"], payload["mailing_list"], payload["spotify_subscribe"]
+        )
+        queue.complete(user_id)
+    except Exception as e:
+        app.logger.error(f"Error storing user data for user_id {user_id}: {e}", exc_info=True)
+        queue.fail(user_id, e)
+    finally:
+        # The worker's app context lives for the whole process; don't carry a session across jobs
+        db.session.remove()
+
+
+if __name__ == "__main__":
+    run()